@@ -0,0 +1,252 @@
+"""
+PyFingerprint benchmarks
+
+Runs the `PyFingerprint` class on CPython against the sensor emulator (see
+`pyfingerprint_emulator.py`) and reports for each baud rate and packet size:
+
+ * the round trip time of common commands,
+ * the throughput of `downloadCharacteristics()` and `uploadCharacteristics()`,
+ * the peak memory allocated while running each command, including the
+   buffers of the emulator.
+
+It also runs library features against a sensor with thousands of positions:
+occupancy tracking, partitioned search and template paging.
+
+The time of a command is the host processing time (without the time spent
+in the emulator) plus the time the emulator models for it, processing on the
+sensor and transfer on the link.
+
+Usage: python benchmarks/benchmark.py [--repeat N] [--json FILE]
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyfingerprint import PyFingerprint, FINGERPRINT_CHARBUFFER1, FINGERPRINT_CHARBUFFER2
+from pyfingerprint_emulator import SensorEmulator
+from pyfingerprint_store import TemplateStore, TemplatePager
+
+BAUDRATES = (9600, 57600, 115200)
+PACKETSIZES = (32, 64, 128, 256)
+
+TEMPLATES = 100
+CHARACTERISTICS = bytes(i & 0xFF for i in range(512))
+
+LIBRARY_CAPACITY = 3000
+LIBRARY_TEMPLATES = 2990
+LIBRARY_USERS = 500
+
+
+class TimedEmulator(SensorEmulator):
+    """
+    Emulator that answers immediately and counts the host time spent in it.
+
+    """
+
+    def __init__(self, **kwargs):
+        SensorEmulator.__init__(self, speed = 0, **kwargs)
+        self.processingTime = 0.0
+
+    def write(self, data):
+        start = time.perf_counter()
+        count = SensorEmulator.write(self, data)
+        self.processingTime += time.perf_counter() - start
+        return count
+
+    def resetCounters(self):
+        SensorEmulator.resetCounters(self)
+        self.processingTime = 0.0
+
+
+def measure(uart, function, repeat):
+    """
+    Measures a function.
+
+    Arguments:
+        uart (TimedEmulator): The emulator the function talks to
+        function (callable): The function
+        repeat (int): The number of runs
+
+    Returns:
+        A tuple that contain the following information:
+        0: float The mean time of a run in seconds, host and modeled.
+        1: float The mean host time of a run in seconds.
+        2: integer The peak memory allocated by a run in bytes.
+    """
+
+    ## Warm up, e.g. fill the system parameter cache
+    function()
+
+    uart.resetCounters()
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        function()
+
+    hostTime = (time.perf_counter() - start - uart.processingTime) / repeat
+    modeledTime = uart.getModeledTime() / 1000000 / repeat
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return (hostTime + modeledTime, hostTime, peak)
+
+
+def benchmark(baudrate, packetSize, repeat):
+    """
+    Runs all benchmarks for one link configuration.
+
+    Arguments:
+        baudrate (int): The baud rate
+        packetSize (int): The maximum packet size
+        repeat (int): The number of runs of each command
+
+    Returns:
+        A dictionary with the results by benchmark name.
+    """
+
+    uart = TimedEmulator(baudrate = baudrate, capacity = 1000, packetSize = packetSize)
+    f = PyFingerprint(uart)
+
+    for position in range(TEMPLATES):
+        uart.setTemplate(position, uart.getCharacteristics(position))
+
+    ## Every image is of the finger of the last template
+    uart.placeFinger(TEMPLATES - 1)
+
+    buffer = bytearray(512)
+
+    commands = (
+        ('handshake', f.handshake),
+        ('verifyPassword', f.verifyPassword),
+        ('readImage', f.readImage),
+        ('convertImage', lambda: f.convertImage(FINGERPRINT_CHARBUFFER2)),
+        ('loadTemplate', lambda: f.loadTemplate(TEMPLATES - 1, FINGERPRINT_CHARBUFFER1)),
+        ('searchTemplate', f.searchTemplate),
+        ('getTemplateCount', f.getTemplateCount),
+        ('downloadCharacteristics', lambda: f.downloadCharacteristics(FINGERPRINT_CHARBUFFER1, buffer)),
+        ('uploadCharacteristics', lambda: f.uploadCharacteristics(FINGERPRINT_CHARBUFFER2, CHARACTERISTICS, verify = False)),
+    )
+
+    results = {}
+
+    for name, function in commands:
+        total, host, peak = measure(uart, function, repeat)
+        results[name] = {'time': total, 'host': host, 'peak': peak}
+
+        if ( name.endswith('Characteristics') ):
+            results[name]['throughput'] = len(CHARACTERISTICS) / total
+
+    return results
+
+
+def libraryBenchmark(repeat):
+    """
+    Runs the library benchmarks on a nearly full sensor with thousands of positions.
+
+    Arguments:
+        repeat (int): The number of runs of each feature
+
+    Returns:
+        A dictionary with the results by benchmark name.
+    """
+
+    uart = TimedEmulator(capacity = LIBRARY_CAPACITY)
+    f = PyFingerprint(uart)
+
+    for position in range(LIBRARY_TEMPLATES):
+        uart.setTemplate(position, uart.getCharacteristics(position))
+
+    f.definePartition('last', LIBRARY_TEMPLATES - 100, 100)
+    f.loadTemplate(LIBRARY_TEMPLATES - 1, FINGERPRINT_CHARBUFFER1)
+
+    ## The pager cycles through more users than it has positions, so every page is a miss
+    path = os.path.join(tempfile.mkdtemp(), 'store.bin')
+    store = TemplateStore.create(path, 0x0009, LIBRARY_USERS)
+
+    for userId in range(LIBRARY_USERS):
+        store.put(userId, uart.getCharacteristics(LIBRARY_CAPACITY + userId))
+
+    pager = TemplatePager(f, store, LIBRARY_TEMPLATES, LIBRARY_CAPACITY - LIBRARY_TEMPLATES)
+    users = iter(range(10 ** 9))
+
+    features = (
+        ('refreshTemplateIndex', f.refreshTemplateIndex),
+        ('getFreePosition', f.getFreePosition),
+        ('searchTemplate', f.searchTemplate),
+        ('searchTemplate partition', lambda: f.searchTemplate(partition = 'last')),
+        ('TemplatePager.page', lambda: pager.page(next(users) % LIBRARY_USERS)),
+    )
+
+    results = {}
+
+    try:
+        for name, function in features:
+            total, host, peak = measure(uart, function, repeat)
+            results[name] = {'time': total, 'host': host, 'peak': peak}
+
+    finally:
+        store.close()
+        os.remove(path)
+
+    return results
+
+
+def report(title, results):
+    """
+    Prints the results of a benchmark run.
+
+    Arguments:
+        title (str): The title of the run
+        results (dict): The results by benchmark name
+    """
+
+    print(title)
+    print('  %-24s %10s %10s %10s %12s' % ('command', 'time ms', 'host ms', 'peak B', 'bytes/s'))
+
+    for name in results:
+        result = results[name]
+        throughput = '%12.0f' % result['throughput'] if 'throughput' in result else '%12s' % '-'
+        print('  %-24s %10.3f %10.3f %10d %s' % (name, result['time'] * 1000, result['host'] * 1000, result['peak'], throughput))
+
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmarks PyFingerprint against the sensor emulator.')
+    parser.add_argument('--repeat', type = int, default = 50, help = 'runs of each command (default: 50)')
+    parser.add_argument('--json', help = 'also write the results to this file')
+    arguments = parser.parse_args()
+
+    allResults = {}
+
+    for baudrate in BAUDRATES:
+        for packetSize in PACKETSIZES:
+            results = benchmark(baudrate, packetSize, arguments.repeat)
+            allResults[str(baudrate) + '/' + str(packetSize)] = results
+
+            report('%d baud, %d byte packets' % (baudrate, packetSize), results)
+
+    results = libraryBenchmark(arguments.repeat)
+    allResults['library'] = results
+
+    report('library, %d positions' % LIBRARY_CAPACITY, results)
+
+    if ( arguments.json ):
+        with open(arguments.json, 'w') as f:
+            json.dump(allResults, f, indent = 2, sort_keys = True)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,33 @@ All rights reserved.
 
 """
 
-import ustruct
-from micropython import const
+import io
+
+try:
+    from micropython import const
+    from time import ticks_ms, ticks_us, ticks_add, ticks_diff, sleep_ms
+
+except ImportError:
+    ## Running on CPython, e.g. for the benchmarks
+    from time import monotonic, sleep
+
+    def const(value):
+        return value
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_us():
+        return int(monotonic() * 1000000)
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(ticks1, ticks2):
+        return ticks1 - ticks2
+
+    def sleep_ms(milliseconds):
+        sleep(milliseconds / 1000)
 
 
 ## Baotou start byte
@@ -140,6 +165,40 @@ FINGERPRINT_PACKETRESPONSEFAIL = const(0x0E)
 FINGERPRINT_ERROR_TIMEOUT = const(0xFF)
 FINGERPRINT_ERROR_BADPACKET = const(0xFE)
 
+FINGERPRINT_DEFAULT_TIMEOUT = const(5000)
+"""Default time in milliseconds to wait for a complete packet from the sensor."""
+
+FINGERPRINT_POLL_MIN_INTERVAL = const(10)
+"""Default time in milliseconds between finger polls once a finger is expected."""
+
+FINGERPRINT_POLL_MAX_INTERVAL = const(320)
+"""Default longest time in milliseconds between finger polls while no finger is present."""
+
+FINGERPRINT_CAPTURE_ATTEMPTS = const(3)
+"""Default number of images read by `capture()` before giving up."""
+
+FINGERPRINT_NEGOTIATE_BAUDRATES = (19200, 38400, 57600, 115200)
+"""Default baud rates tried by `negotiate()`, in ascending order."""
+
+FINGERPRINT_NEGOTIATE_TIMEOUT = const(200)
+"""Time in milliseconds to wait for the hand shake after a link change in `negotiate()`."""
+
+## Template index table
+##
+
+FINGERPRINT_TEMPLATEINDEX_PAGEBYTES = const(32)
+
+## Number of set bits of every byte value
+_BITCOUNT = bytes(bin(i).count('1') for i in range(256))
+
+## I/O requests yielded by commands
+##
+
+_WRITE = const(0)
+_READ = const(1)
+_SLEEP = const(2)
+_IDLE = const(3)
+
 ## Char buffers
 ##
 
@@ -153,6 +212,16 @@ FINGERPRINT_CHARBUFFER2 = const(0x02)
 Char buffer 2
 """
 
+class FingerprintTimeoutError(Exception):
+    """
+    Raised when the sensor does not send a complete packet in time.
+
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.code = FINGERPRINT_ERROR_TIMEOUT
+
 class PyFingerprint(object):
     """
     Manages ZhianTec fingerprint sensors.
@@ -161,8 +230,24 @@ class PyFingerprint(object):
     __address = None
     __password = None
     __serial = None
-
-    def __init__(self, uart, address=0xFFFFFFFF, password=0x00000000):
+    __txBuffer = None
+    __txView = None
+    __rxBuffer = None
+    __rxView = None
+    __systemParameters = None
+    __templateIndex = None
+    __templateCount = 0
+    __freeHint = 0
+    __partitions = None
+    __timeout = None
+    __commandTimeout = None
+    __posted = None
+    __postedError = None
+    __deferred = None
+    __statistics = None
+    __recorder = None
+
+    def __init__(self, uart, address=0xFFFFFFFF, password=0x00000000, timeout=FINGERPRINT_DEFAULT_TIMEOUT):
         """
         Constructor.
 
@@ -172,6 +257,8 @@ class PyFingerprint(object):
             enables different flavors of MicroPython to be supported.
             address (int): The sensor address
             password (int): The sensor password
+            timeout (int): Maximum time in milliseconds to wait for a complete
+            packet from the sensor, or None to wait forever
 
         Raises:
             ValueError: if address or password are invalid
@@ -187,6 +274,127 @@ class PyFingerprint(object):
 
         # Initialize PySerial connection
         self.__serial = uart
+        self.__timeout = timeout
+
+        ## Timeout of the command being run, see _withTimeout()
+        self.__commandTimeout = None
+
+        ## Transmit buffer large enough for the biggest data packet (256 bytes)
+        self.__txBuffer = bytearray(9 + 256 + 2)
+        self.__txView = memoryview(self.__txBuffer)
+
+        ## Receive buffer reused for every packet read from the sensor
+        self.__rxBuffer = bytearray(9 + 256 + 2)
+        self.__rxView = memoryview(self.__rxBuffer)
+
+        ## System parameters are fetched lazily on first use
+        self.__systemParameters = None
+
+        ## Occupancy bitmap of the template database (one bit per position),
+        ## loaded lazily on first use
+        self.__templateIndex = None
+        self.__templateCount = 0
+        self.__freeHint = 0
+
+        ## Named position ranges, see definePartition()
+        self.__partitions = {}
+
+        ## Commands whose ack is still outstanding, and host work to run
+        ## while the sensor processes a command, see defer()
+        self.__posted = []
+        self.__postedError = None
+        self.__deferred = []
+
+        ## Optional command statistics, see setInstrumentation()
+        self.__statistics = None
+
+        ## Optional frame recorder, see setRecorder()
+        self.__recorder = None
+
+    def setTimeout(self, timeout):
+        """
+        Sets the maximum time to wait for a complete packet from the sensor.
+
+        Arguments:
+            timeout (int): The timeout in milliseconds, or None to wait forever
+        """
+
+        self.__timeout = timeout
+
+    def getTimeout(self):
+        """
+        Gets the maximum time to wait for a complete packet from the sensor.
+
+        Returns:
+            The timeout in milliseconds (int) or None.
+        """
+
+        return self.__timeout
+
+    def setInstrumentation(self, statistics):
+        """
+        Sets the object that records the latency, the bytes and the errors of
+        every command, e.g. a `pyfingerprint_stats.CommandStatistics`.
+
+        Arguments:
+            statistics: The statistics, or None to disable the instrumentation
+        """
+
+        self.__statistics = statistics
+
+    def getInstrumentation(self):
+        """
+        Gets the object that records the command statistics.
+
+        Returns:
+            The statistics or None.
+        """
+
+        return self.__statistics
+
+    def setRecorder(self, recorder):
+        """
+        Sets the object that records every frame sent to and received from
+        the sensor and the bytes received outside of a frame, e.g. a
+        `pyfingerprint_trace.TraceRecorder`.
+
+        Arguments:
+            recorder: The recorder, or None to stop recording
+        """
+
+        self.__recorder = recorder
+
+    def getRecorder(self):
+        """
+        Gets the object that records the frames.
+
+        Returns:
+            The recorder or None.
+        """
+
+        return self.__recorder
+
+    def __deadline(self, timeout):
+        """
+        Calculates the deadline for a read.
+
+        Arguments:
+            timeout (int): The timeout in milliseconds, or None to use the timeout of the command or the instance
+
+        Returns:
+            The deadline in `time.ticks_ms()` ticks (int), or None for no deadline.
+        """
+
+        if ( timeout is None ):
+            timeout = self.__commandTimeout
+
+        if ( timeout is None ):
+            timeout = self.__timeout
+
+        if ( timeout is None ):
+            return None
+
+        return ticks_add(ticks_ms(), timeout)
 
     def __del__(self):
         """Destructor."""
@@ -241,140 +449,442 @@ class PyFingerprint(object):
         result = n & twoP
         return int(result > 0)
 
-    def __byteToString(self, byte):
+    def __writePacket(self, packetType, packetPayload):
+        """
+        Sends a packet to the sensor.
+
+        The complete frame is assembled in a preallocated buffer and yielded
+        as a single write request.
+
+        Arguments:
+            packetType (int): The packet type (either `FINGERPRINT_COMMANDPACKET`, `FINGERPRINT_DATAPACKET` or `FINGERPRINT_ENDDATAPACKET`)
+            packetPayload (tuple): The payload (tuple, list or any object supporting the buffer protocol)
+        """
+
+        payloadLength = len(packetPayload)
+
+        ## The packet length = package payload (n bytes) + checksum (2 bytes)
+        packetLength = payloadLength + 2
+
+        ## Grow the transmit buffer if the payload exceeds the largest packet size
+        if ( 9 + packetLength > len(self.__txBuffer) ):
+            self.__txBuffer = bytearray(9 + packetLength)
+            self.__txView = memoryview(self.__txBuffer)
+
+        frame = self.__txBuffer
+
+        ## Write header
+        frame[0] = self.__rightShift(FINGERPRINT_STARTCODE, 8)
+        frame[1] = self.__rightShift(FINGERPRINT_STARTCODE, 0)
+
+        frame[2] = self.__rightShift(self.__address, 24)
+        frame[3] = self.__rightShift(self.__address, 16)
+        frame[4] = self.__rightShift(self.__address, 8)
+        frame[5] = self.__rightShift(self.__address, 0)
+
+        frame[6] = packetType
+
+        frame[7] = self.__rightShift(packetLength, 8)
+        frame[8] = self.__rightShift(packetLength, 0)
+
+        ## The packet checksum = packet type (1 byte) + packet length (2 bytes) + payload (n bytes)
+        packetChecksum = packetType + frame[7] + frame[8]
+
+        ## Write payload
+        if ( isinstance(packetPayload, (bytes, bytearray, memoryview)) ):
+            self.__txView[9:9 + payloadLength] = packetPayload
+            packetChecksum += sum(packetPayload)
+        else:
+            for i in range(0, payloadLength):
+                frame[9 + i] = packetPayload[i]
+                packetChecksum += packetPayload[i]
+
+        ## Write checksum (2 bytes)
+        frame[9 + payloadLength] = self.__rightShift(packetChecksum, 8)
+        frame[10 + payloadLength] = self.__rightShift(packetChecksum, 0)
+
+        if ( self.__recorder is not None ):
+            self.__recorder.frameSent(self.__txView[:9 + packetLength])
+
+        if ( self.__statistics is not None ):
+            if ( packetType == FINGERPRINT_COMMANDPACKET ):
+                self.__statistics.commandSent(frame[9], 9 + packetLength)
+            else:
+                self.__statistics.packetSent(9 + packetLength)
+
+        yield (_WRITE, self.__txView[:9 + packetLength])
+
+    def __readInto(self, view, deadline):
         """
-        Converts a byte to string.
+        Fills the given buffer completely with bytes received from the sensor.
 
         Arguments:
-            byte (int): The byte
+            view (memoryview): The buffer to fill
+            deadline (int): The deadline in `time.ticks_ms()` ticks, or None to wait forever
+
+        Raises:
+            FingerprintTimeoutError: if the deadline passes
+        """
+
+        received = 0
+        length = len(view)
+
+        while ( received < length ):
+            count = self.__serial.readinto(view[received:])
+
+            if ( count ):
+                received += count
+
+            elif ( deadline is not None and ticks_diff(deadline, ticks_ms()) <= 0 ):
+                raise FingerprintTimeoutError('The sensor did not respond in time!')
+
+    def __readPacket(self, timeout = None):
+        """
+        Receives a packet from the sensor.
+
+        The header is read first, then exactly the announced number of bytes
+        into a reusable receive buffer. The returned payload is a view into
+        that buffer and is only valid until the next packet is read.
+
+        Arguments:
+            timeout (int): Maximum time in milliseconds to receive the whole packet, or None to use the timeout of the command or the instance
 
         Returns:
-            The string (str)
+            A tuple that contain the following information:
+            0: integer(1 byte) The packet type.
+            1: memoryview(n bytes) The packet payload.
+
+        Raises:
+            FingerprintTimeoutError: if the packet is not received in time
+            Exception: if the header or the checksum is wrong
         """
 
-        return ustruct.pack('@B', byte)
+        receivedPacketData = self.__rxBuffer
+
+        ## One deadline covers the whole packet. A read is answered with the
+        ## deadline used, which is a later one for a resumed posted command.
+        deadline = yield (_READ, self.__rxView[:9], self.__deadline(timeout))
+
+        ## Check the packet header
+        if ( receivedPacketData[0] != self.__rightShift(FINGERPRINT_STARTCODE, 8) or receivedPacketData[1] != self.__rightShift(FINGERPRINT_STARTCODE, 0) ):
+            raise Exception('The received packet do not begin with a valid header!')
+
+        ## Calculate packet payload length (combine the 2 length bytes)
+        packetPayloadLength = self.__leftShift(receivedPacketData[7], 8)
+        packetPayloadLength = packetPayloadLength | self.__leftShift(receivedPacketData[8], 0)
+
+        ## The length covers the payload (at most 256 bytes) and the 2 checksum
+        ## bytes, anything else is a corrupted header
+        if ( packetPayloadLength < 2 or 9 + packetPayloadLength > len(receivedPacketData) ):
+            raise Exception('The received packet has an invalid length!')
+
+        ## Read the payload and the 2 checksum bytes
+        yield (_READ, self.__rxView[9:9 + packetPayloadLength], deadline)
+
+        if ( self.__recorder is not None ):
+            self.__recorder.frameReceived(self.__rxView[:9 + packetPayloadLength])
+
+        packetType = receivedPacketData[6]
 
-    def __stringToByte(self, string):
+        ## Payload without the last 2 checksum bytes
+        packetPayload = self.__rxView[9:9 + packetPayloadLength - 2]
+
+        ## Calculate checksum:
+        ## checksum = packet type (1 byte) + packet length (2 bytes) + packet payload (n bytes)
+        packetChecksum = packetType + receivedPacketData[7] + receivedPacketData[8] + sum(packetPayload)
+
+        ## Calculate full checksum of the 2 separate checksum bytes
+        receivedChecksum = self.__leftShift(receivedPacketData[7 + packetPayloadLength], 8)
+        receivedChecksum = receivedChecksum | self.__leftShift(receivedPacketData[8 + packetPayloadLength], 0)
+
+        if ( self.__statistics is not None ):
+            self.__statistics.packetReceived(9 + packetPayloadLength)
+
+            if ( receivedChecksum != packetChecksum & 0xFFFF ):
+                self.__statistics.checksumFailed()
+
+        if ( receivedChecksum != packetChecksum & 0xFFFF ):
+            raise Exception('The received packet is corrupted (the checksum is wrong)!')
+
+        return (packetType, packetPayload)
+
+    def _execute(self, command, post = False, timeout = None):
         """
-        Convert one "string" byte (like '0xFF') to real integer byte (0xFF).
+        Runs a command and performs its I/O on the UART, blocking until it is done.
+
+        The I/O requests of the command are produced by `_run()`. Subclasses
+        override this method to perform them differently, see
+        `PyFingerprintAsync`.
 
         Arguments:
-            string (str): The string
+            command (generator): The command
+            post (bool): Do not wait for the response of the command
+            timeout (int): Maximum time in milliseconds to wait for each packet of the command, or None to use the instance timeout
 
         Returns:
-            The byte (int)
+            The result of the command, or None if it is posted.
         """
 
-        return ustruct.unpack('@B', string)[0]
+        requests = self._run(command, post, timeout)
 
-    def __writePacket(self, packetType, packetPayload):
+        try:
+            request = next(requests)
+
+            while ( True ):
+                try:
+                    if ( request[0] == _WRITE ):
+                        self.__serial.write(request[1])
+                    elif ( request[0] == _READ ):
+                        self.__readInto(request[1], request[2])
+                    else:
+                        sleep_ms(request[1])
+
+                except Exception as e:
+                    request = requests.throw(e)
+                    continue
+
+                request = next(requests)
+
+        except StopIteration as e:
+            return e.value
+
+    def _run(self, command, post = False, timeout = None):
         """
-        Sends a packet to the sensor.
+        Runs a command up to the I/O it needs.
+
+        Every command is a generator that yields the I/O it needs:
+        `(_WRITE, frame)` to send a frame, `(_READ, view, deadline)` to fill
+        a buffer with bytes received from the sensor before the deadline,
+        `(_SLEEP, milliseconds)` to pause and `(_IDLE, milliseconds)` to
+        pause between two polls for a finger, when no exchange is under way
+        and other commands may use the sensor. A read is answered with the
+        deadline used. This generator yields the same requests, to be
+        performed by `_execute()`, which raises an error of the I/O, e.g. a
+        `FingerprintTimeoutError`, inside it so the command can handle it.
+
+        A posted command returns as soon as it is sent. Its response is
+        read, in order, before the next command is sent, so the host can
+        continue while the sensor processes it. The response is then awaited
+        with a full timeout. An error of a posted command does not keep the
+        next command from running, it is kept for `getPostedError()`.
+
+        An error of the deferred host work, see `defer()`, is raised once the
+        command during which it ran is complete.
 
         Arguments:
-            packetType (int): The packet type (either `FINGERPRINT_COMMANDPACKET`, `FINGERPRINT_DATAPACKET` or `FINGERPRINT_ENDDATAPACKET`)
-            packetPayload (tuple): The payload
+            command (generator): The command
+            post (bool): Do not wait for the response of the command
+            timeout (int): Maximum time in milliseconds to wait for each packet of the command, or None to use the instance timeout
+
+        Returns:
+            The result of the command, or None if it is posted.
         """
 
-        ## Write header (one byte at once)
-        self.__serial.write(self.__byteToString(self.__rightShift(FINGERPRINT_STARTCODE, 8)))
-        self.__serial.write(self.__byteToString(self.__rightShift(FINGERPRINT_STARTCODE, 0)))
+        if ( timeout is not None ):
+            command = self._withTimeout(command, timeout)
 
-        self.__serial.write(self.__byteToString(self.__rightShift(self.__address, 24)))
-        self.__serial.write(self.__byteToString(self.__rightShift(self.__address, 16)))
-        self.__serial.write(self.__byteToString(self.__rightShift(self.__address, 8)))
-        self.__serial.write(self.__byteToString(self.__rightShift(self.__address, 0)))
+        yield from self.__resumePosted()
 
-        self.__serial.write(self.__byteToString(packetType))
+        return (yield from self.__run(command, None, post))
 
-        ## The packet length = package payload (n bytes) + checksum (2 bytes)
-        packetLength = len(packetPayload) + 2
+    def __resumePosted(self):
+        """
+        Reads the outstanding responses of the posted commands, in order. On
+        a shared UART these may belong to other sensors, see `_sharePosted()`.
+        """
 
-        self.__serial.write(self.__byteToString(self.__rightShift(packetLength, 8)))
-        self.__serial.write(self.__byteToString(self.__rightShift(packetLength, 0)))
+        posted = self.__posted
 
-        ## The packet checksum = packet type (1 byte) + packet length (2 bytes) + payload (n bytes)
-        packetChecksum = packetType + self.__rightShift(packetLength, 8) + self.__rightShift(packetLength, 0)
+        while ( posted ):
+            sensor, command, request, timeout = posted.pop(0)
 
-        ## Write payload
-        for i in range(0, len(packetPayload)):
-            self.__serial.write(self.__byteToString(packetPayload[i]))
-            packetChecksum += packetPayload[i]
+            try:
+                deadline = None if timeout is None else ticks_add(ticks_ms(), timeout)
+                yield from sensor.__run(command, (request[0], request[1], deadline), False)
 
-        ## Write checksum (2 bytes)
-        self.__serial.write(self.__byteToString(self.__rightShift(packetChecksum, 8)))
-        self.__serial.write(self.__byteToString(self.__rightShift(packetChecksum, 0)))
+            except Exception as e:
+                sensor.__postedError = e
 
-    def __readPacket(self):
+    def _sharePosted(self, posted):
         """
-        Receives a packet from the sensor.
+        Uses the given queue of posted commands, shared by all sensors on the
+        same UART, as their responses arrive on it in the order the commands
+        were sent.
+
+        Arguments:
+            posted (list): The queue
+        """
+
+        self.__posted = posted
+
+    def _remaining(self, deadline):
+        """
+        Calculates the time left until a deadline.
+
+        Arguments:
+            deadline (int): The deadline in `time.ticks_ms()` ticks, or None
 
         Returns:
-            A tuple that contain the following information:
-            0: integer(1 byte) The packet type.
-            1: integer(n bytes) The packet payload.
+            The time in milliseconds (int), or None for no deadline.
+        """
 
-        Raises:
-            Exception: if checksum is wrong
+        return None if deadline is None else max(0, ticks_diff(deadline, ticks_ms()))
+
+    def getPostedError(self):
+        """
+        Gets the error of the last posted command that failed, e.g. of
+        `ledOn(wait=False)`, and forgets it.
+
+        Returns:
+            The exception or None.
+        """
+
+        error = self.__postedError
+        self.__postedError = None
+        return error
+
+    def _withTimeout(self, command, timeout):
+        """
+        Wraps a command so its packet reads use the given timeout instead of the instance timeout.
+
+        The timeout only applies while the command itself runs, so it also
+        holds for a posted command and when other commands run in between.
+
+        Arguments:
+            command (generator): The command
+            timeout (int): The timeout in milliseconds
+
+        Returns:
+            The wrapped command (generator).
         """
 
-        receivedPacketData = []
-        i = 0
+        value = None
+        error = None
 
         while ( True ):
+            previous = self.__commandTimeout
+            self.__commandTimeout = timeout
 
-            # Read one byte
-            receivedFragment = self.__serial.read(1)
+            try:
+                if ( error is None ):
+                    request = command.send(value)
+                else:
+                    request = command.throw(error)
 
-            if (receivedFragment is not None and len(receivedFragment) != 0):
-                receivedFragment = self.__stringToByte(receivedFragment)
-                ## print 'Received packet fragment = ' + hex(receivedFragment
-            else:
-                continue
+            except StopIteration as e:
+                return e.value
 
-            ## Insert byte if packet seems valid
-            receivedPacketData.insert(i, receivedFragment)
-            i += 1
+            finally:
+                self.__commandTimeout = previous
 
-            ## Packet could be complete (the minimal packet size is 12 bytes)
-            if ( i >= 12 ):
+            value = None
+            error = None
 
-                ## Check the packet header
-                if ( receivedPacketData[0] != self.__rightShift(FINGERPRINT_STARTCODE, 8) or receivedPacketData[1] != self.__rightShift(FINGERPRINT_STARTCODE, 0) ):
-                    raise Exception('The received packet do not begin with a valid header!')
+            try:
+                value = yield request
 
-                ## Calculate packet payload length (combine the 2 length bytes)
-                packetPayloadLength = self.__leftShift(receivedPacketData[7], 8)
-                packetPayloadLength = packetPayloadLength | self.__leftShift(receivedPacketData[8], 0)
+            except Exception as e:
+                error = e
 
-                ## Check if the packet is still fully received
-                ## Condition: index counter < packet payload length + packet frame
-                if ( i < packetPayloadLength + 9 ):
+    def __run(self, command, request, post):
+        """
+        Runs a command, yielding the I/O requests to perform.
+
+        Arguments:
+            command (generator): The command
+            request (tuple): The request to continue a posted command with, or None to start the command
+            post (bool): Stop at the first read and queue the command
+
+        Returns:
+            The result of the command, or None if it is posted.
+        """
+
+        deferredError = None
+
+        try:
+            if ( request is None ):
+                request = next(command)
+
+            while ( True ):
+                value = None
+
+                try:
+                    if ( request[0] == _READ ):
+                        if ( post ):
+                            if ( self.__statistics is not None ):
+                                self.__statistics.commandPosted()
+
+                            ## Keep the timeout, the deadline is set when the command is resumed
+                            self.__posted.append((self, command, request, self._remaining(request[2])))
+                            return None
+
+                        ## The sensor is busy, run the deferred host work meanwhile
+                        error = self.__runDeferred()
+
+                        if ( deferredError is None ):
+                            deferredError = error
+
+                        value = request[2]
+
+                    yield request
+
+                    ## Other commands may have been posted meanwhile, their
+                    ## responses arrive before the next one of this command
+                    if ( request[0] == _IDLE ):
+                        yield from self.__resumePosted()
+
+                except Exception as e:
+                    if ( isinstance(e, FingerprintTimeoutError) and self.__statistics is not None ):
+                        self.__statistics.timedOut()
+
+                    request = command.throw(e)
                     continue
 
-                ## At this point the packet should be fully received
+                request = command.send(value)
+
+        except StopIteration as e:
+            result = e.value
+
+        ## The response is read completely, now report the failed host work
+        if ( deferredError is not None ):
+            raise deferredError
+
+        return result
+
+    def __runDeferred(self):
+        """
+        Runs the deferred host work.
+
+        Returns:
+            The error of the first function that failed, or None. The functions after it stay queued.
+        """
+
+        deferred = self.__deferred
 
-                packetType = receivedPacketData[6]
+        while ( deferred ):
+            try:
+                deferred.pop(0)()
 
-                ## Calculate checksum:
-                ## checksum = packet type (1 byte) + packet length (2 bytes) + packet payload (n bytes)
-                packetChecksum = packetType + receivedPacketData[7] + receivedPacketData[8]
+            except Exception as e:
+                return e
 
-                packetPayload = []
+        return None
 
-                ## Collect package payload (ignore the last 2 checksum bytes)
-                for j in range(9, 9 + packetPayloadLength - 2):
-                    packetPayload.append(receivedPacketData[j])
-                    packetChecksum += receivedPacketData[j]
+    def defer(self, function):
+        """
+        Queues host work, e.g. reading the next template from a host-side
+        store, to run while the sensor processes the next command. The
+        functions run in the order they were queued.
 
-                ## Calculate full checksum of the 2 separate checksum bytes
-                receivedChecksum = self.__leftShift(receivedPacketData[i - 2], 8)
-                receivedChecksum = receivedChecksum | self.__leftShift(receivedPacketData[i - 1], 0)
+        Note: The functions should be short, the response of the sensor is
+        buffered by the UART until they are done. An error of a function is
+        raised once the command it ran along is complete.
 
-                if ( receivedChecksum != packetChecksum ):
-                    raise Exception('The received packet is corrupted (the checksum is wrong)!')
+        Arguments:
+            function (callable): The function, called without arguments
+        """
 
-                return (packetType, packetPayload)
+        self.__deferred.append(function)
 
     def verifyPassword(self):
         """
@@ -387,6 +897,11 @@ class PyFingerprint(object):
             Exception: if an error occured
         """
 
+        return self._execute(self.__verifyPassword())
+
+    def __verifyPassword(self):
+        """Command of `verifyPassword()`."""
+
         packetPayload = (
             FINGERPRINT_VERIFYPASSWORD,
             self.__rightShift(self.__password, 24),
@@ -395,8 +910,8 @@ class PyFingerprint(object):
             self.__rightShift(self.__password, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -435,6 +950,11 @@ class PyFingerprint(object):
             Exception: if an error occured
         """
 
+        return self._execute(self.__setPassword(newPassword))
+
+    def __setPassword(self, newPassword):
+        """Command of `setPassword()`."""
+
         ## Validate the password (maximum 4 bytes)
         if ( newPassword < 0x00000000 or newPassword > 0xFFFFFFFF ):
             raise ValueError('The given password is invalid!')
@@ -447,8 +967,8 @@ class PyFingerprint(object):
             self.__rightShift(newPassword, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -481,6 +1001,11 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__setAddress(newAddress))
+
+    def __setAddress(self, newAddress):
+        """Command of `setAddress()`."""
+
         ## Validate the address (maximum 4 bytes)
         if ( newAddress < 0x00000000 or newAddress > 0xFFFFFFFF ):
             raise ValueError('The given address is invalid!')
@@ -493,8 +1018,8 @@ class PyFingerprint(object):
             self.__rightShift(newAddress, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -505,6 +1030,7 @@ class PyFingerprint(object):
         ## DEBUG: Address set was successful
         if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
             self.__address = newAddress
+            self.__updateSystemParameter(4, newAddress)
             return True
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
@@ -529,6 +1055,11 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__setSystemParameter(parameterNumber, parameterValue))
+
+    def __setSystemParameter(self, parameterNumber, parameterValue):
+        """Command of `setSystemParameter()`."""
+
         ## Validate the baud rate parameter
         if ( parameterNumber == FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE ):
 
@@ -557,8 +1088,8 @@ class PyFingerprint(object):
             parameterValue,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -568,6 +1099,17 @@ class PyFingerprint(object):
 
         ## DEBUG: Parameter set was successful
         if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
+
+            ## Keep the cached system parameters in sync
+            if ( parameterNumber == FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE ):
+                self.__updateSystemParameter(6, parameterValue)
+
+            elif ( parameterNumber == FINGERPRINT_SETSYSTEMPARAMETER_SECURITY_LEVEL ):
+                self.__updateSystemParameter(3, parameterValue)
+
+            else:
+                self.__updateSystemParameter(5, parameterValue)
+
             return True
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
@@ -594,7 +1136,7 @@ class PyFingerprint(object):
         if (baudRate % 9600 != 0):
             raise ValueError("Invalid baud rate")
 
-        self.setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE, baudRate // 9600)
+        return self._execute(self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE, baudRate // 9600))
 
     def setSecurityLevel(self, securityLevel):
         """
@@ -607,7 +1149,7 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        self.setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_SECURITY_LEVEL, securityLevel)
+        return self._execute(self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_SECURITY_LEVEL, securityLevel))
 
     def setMaxPacketSize(self, packetSize):
         """
@@ -628,12 +1170,52 @@ class PyFingerprint(object):
         except KeyError:
             raise ValueError("Invalid packet size")
 
-        self.setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_PACKAGE_SIZE, packetMaxSizeType)
+        return self._execute(self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_PACKAGE_SIZE, packetMaxSizeType))
+
+    def __updateSystemParameter(self, index, value):
+        """
+        Updates one entry of the cached system parameters, if they are cached.
+
+        Arguments:
+            index (int): The index in the tuple returned by `getSystemParameters()`
+            value (int): The new value
+        """
+
+        if ( self.__systemParameters is not None ):
+            systemParameters = list(self.__systemParameters)
+            systemParameters[index] = value
+            self.__systemParameters = tuple(systemParameters)
+
+    def __getCachedSystemParameters(self):
+        """
+        Gets the system parameters, reading them from the sensor only if they are not cached yet.
+
+        Returns:
+            The tuple described in `getSystemParameters()`.
+        """
+
+        if ( self.__systemParameters is None ):
+            yield from self.__getSystemParameters()
+
+        return self.__systemParameters
+
+    def invalidateSystemParameters(self):
+        """
+        Discards the cached system parameters and the occupancy bitmap sized
+        by them, so both are read from the sensor again when next needed.
+        """
+
+        self.__systemParameters = None
+        self.__templateIndex = None
 
     def getSystemParameters(self):
         """
         Gets all available system information of the sensor.
 
+        The parameters are always read from the sensor and the cache used by
+        `getStorageCapacity()`, `getSecurityLevel()`, `getMaxPacketSize()` and
+        `getBaudRate()` is refreshed.
+
         Returns:
             A tuple that contains the following information:
             0: integer(2 bytes) The status register.
@@ -648,12 +1230,17 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__getSystemParameters())
+
+    def __getSystemParameters(self):
+        """Command of `getSystemParameters()`."""
+
         packetPayload = (
             FINGERPRINT_GETSYSTEMPARAMETERS,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -672,7 +1259,8 @@ class PyFingerprint(object):
             packetLength       = self.__leftShift(receivedPacketPayload[13], 8) | self.__leftShift(receivedPacketPayload[14], 0)
             baudRate           = self.__leftShift(receivedPacketPayload[15], 8) | self.__leftShift(receivedPacketPayload[16], 0)
 
-            return (statusRegister, systemID, storageCapacity, securityLevel, deviceAddress, packetLength, baudRate)
+            self.__systemParameters = (statusRegister, systemID, storageCapacity, securityLevel, deviceAddress, packetLength, baudRate)
+            return self.__systemParameters
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
             raise Exception('Communication error')
@@ -682,7 +1270,7 @@ class PyFingerprint(object):
 
     def getStorageCapacity(self):
         """
-        Gets the sensor storage capacity.
+        Gets the sensor storage capacity. The value is taken from the cached system parameters.
 
         Returns:
             The storage capacity (int).
@@ -691,11 +1279,16 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        return self.getSystemParameters()[2]
+        return self._execute(self.__getStorageCapacity())
+
+    def __getStorageCapacity(self):
+        """Command of `getStorageCapacity()`."""
+
+        return (yield from self.__getCachedSystemParameters())[2]
 
     def getSecurityLevel(self):
         """
-        Gets the security level of the sensor.
+        Gets the security level of the sensor. The value is taken from the cached system parameters.
 
         Returns:
             The security level (int).
@@ -704,11 +1297,16 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        return self.getSystemParameters()[3]
+        return self._execute(self.__getSecurityLevel())
+
+    def __getSecurityLevel(self):
+        """Command of `getSecurityLevel()`."""
+
+        return (yield from self.__getCachedSystemParameters())[3]
 
     def getMaxPacketSize(self):
         """
-        Gets the maximum allowed size of a single packet.
+        Gets the maximum allowed size of a single packet. The value is taken from the cached system parameters.
 
         Returns:
             Return the max size (int).
@@ -718,7 +1316,12 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        packetMaxSizeType = self.getSystemParameters()[5]
+        return self._execute(self.__getMaxPacketSize())
+
+    def __getMaxPacketSize(self):
+        """Command of `getMaxPacketSize()`."""
+
+        packetMaxSizeType = (yield from self.__getCachedSystemParameters())[5]
 
         try:
             packetSizes = [32, 64, 128, 256]
@@ -731,7 +1334,7 @@ class PyFingerprint(object):
 
     def getBaudRate(self):
         """
-        Gets the baud rate.
+        Gets the baud rate. The value is taken from the cached system parameters.
 
         Returns:
             The baud rate (int).
@@ -740,24 +1343,31 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        return self.getSystemParameters()[6] * 9600
+        return self._execute(self.__getBaudRate())
 
-    def getTemplateIndex(self, page):
+    def __getBaudRate(self):
+        """Command of `getBaudRate()`."""
+
+        return (yield from self.__getCachedSystemParameters())[6] * 9600
+
+    def __readTemplateIndexPage(self, page):
         """
-        Gets a list of the template positions with usage indicator.
+        Reads one page of the template index table from the sensor.
 
         Arguments:
-            page (int): The page (value between 0 and 3).
+            page (int): The page (value between 0 and 3, higher on sensors with more than 1024 positions).
 
         Returns:
-            The list.
+            The page bytes (memoryview), one bit per template position. Only
+            valid until the next packet is read.
 
         Raises:
             ValueError: if passed page is invalid
             Exception: if any error occurs
         """
 
-        if ( page < 0 or page > 3 ):
+        ## Every page covers 256 positions
+        if ( page < 0 or (page > 3 and page * FINGERPRINT_TEMPLATEINDEX_PAGEBYTES * 8 >= (yield from self.__getStorageCapacity())) ):
             raise ValueError('The given index page is invalid!')
 
         packetPayload = (
@@ -765,8 +1375,8 @@ class PyFingerprint(object):
             page,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -776,19 +1386,8 @@ class PyFingerprint(object):
 
         ## DEBUG: Read index table successfully
         if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
-
-            templateIndex = []
-
             ## Contain the table page bytes (skip the first status byte)
-            pageElements = receivedPacketPayload[1:]
-
-            for pageElement in pageElements:
-                ## Test every bit (bit = template position is used indicator) of a table page element
-                for p in range(0, 7 + 1):
-                    positionIsUsed = (self.__bitAtPosition(pageElement, p) == 1)
-                    templateIndex.append(positionIsUsed)
-
-            return templateIndex
+            return receivedPacketPayload[1:]
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
             raise Exception('Communication error')
@@ -796,10 +1395,251 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
+    def __copyTemplateIndexPage(self, page, pageElements, capacity):
+        """
+        Copies one page of the template index table into the occupancy bitmap.
+
+        Arguments:
+            page (int): The page
+            pageElements (memoryview): The page bytes
+            capacity (int): The storage capacity
+        """
+
+        templateIndex = self.__templateIndex
+        offset = page * FINGERPRINT_TEMPLATEINDEX_PAGEBYTES
+
+        count = min(len(pageElements), len(templateIndex) - offset)
+
+        for i in range(0, count):
+            self.__templateCount += _BITCOUNT[pageElements[i]] - _BITCOUNT[templateIndex[offset + i]]
+            templateIndex[offset + i] = pageElements[i]
+
+        ## Bits beyond the storage capacity are never counted as used
+        lastBits = capacity % 8
+
+        if ( lastBits != 0 and offset + count == len(templateIndex) ):
+            unusedBits = templateIndex[-1] & ~((1 << lastBits) - 1) & 0xFF
+            self.__templateCount -= _BITCOUNT[unusedBits]
+            templateIndex[-1] ^= unusedBits
+
+        self.__freeHint = 0
+
+    def __loadTemplateIndex(self):
+        """
+        Loads the occupancy bitmap from the sensor, if it is not loaded yet.
+        """
+
+        if ( self.__templateIndex is not None ):
+            return
+
+        capacity = yield from self.__getStorageCapacity()
+
+        self.__templateIndex = bytearray((capacity + 7) // 8)
+        self.__templateCount = 0
+
+        for page in range(0, (capacity + 255) // 256):
+            self.__copyTemplateIndexPage(page, (yield from self.__readTemplateIndexPage(page)), capacity)
+
+    def __markTemplates(self, positionNumber, count, used):
+        """
+        Marks template positions as used or free in the occupancy bitmap, if it is loaded.
+
+        Arguments:
+            positionNumber (int): The first position
+            count (int): The number of positions
+            used (bool): True to mark the positions as used, False to mark them as free
+        """
+
+        templateIndex = self.__templateIndex
+
+        if ( templateIndex is None ):
+            return
+
+        for position in range(positionNumber, positionNumber + count):
+            mask = 1 << (position & 7)
+            isUsed = (templateIndex[position >> 3] & mask) != 0
+
+            if ( used and not isUsed ):
+                templateIndex[position >> 3] |= mask
+                self.__templateCount += 1
+
+            elif ( not used and isUsed ):
+                templateIndex[position >> 3] &= ~mask & 0xFF
+                self.__templateCount -= 1
+
+        if ( not used and (positionNumber >> 3) < self.__freeHint ):
+            self.__freeHint = positionNumber >> 3
+
+    def refreshTemplateIndex(self):
+        """
+        Reads the template index table from the sensor into the occupancy
+        bitmap used by `storeTemplate()`, `getFreePosition()`,
+        `isPositionUsed()` and `getTemplateCount()`.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__refreshTemplateIndex())
+
+    def __refreshTemplateIndex(self):
+        """Command of `refreshTemplateIndex()`."""
+
+        self.__templateIndex = None
+        yield from self.__loadTemplateIndex()
+
+    def getTemplateBitmap(self):
+        """
+        Gets a copy of the occupancy bitmap. Bit p (least significant first)
+        of byte i tells if position 8 * i + p is used.
+
+        Returns:
+            The bitmap (bytes).
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__getTemplateBitmap())
+
+    def __getTemplateBitmap(self):
+        """Command of `getTemplateBitmap()`."""
+
+        yield from self.__loadTemplateIndex()
+
+        return bytes(self.__templateIndex)
+
+    def isPositionUsed(self, positionNumber):
+        """
+        Checks if a template is stored at the given position, using the occupancy bitmap.
+
+        Arguments:
+            positionNumber (int): The position
+
+        Returns:
+            True if the position is used or False otherwise.
+
+        Raises:
+            ValueError: if passed position is invalid
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__isPositionUsed(positionNumber))
+
+    def __isPositionUsed(self, positionNumber):
+        """Command of `isPositionUsed()`."""
+
+        if ( positionNumber < 0x0000 or positionNumber >= (yield from self.__getStorageCapacity()) ):
+            raise ValueError('The given position number is invalid!')
+
+        yield from self.__loadTemplateIndex()
+
+        return self.__bitAtPosition(self.__templateIndex[positionNumber >> 3], positionNumber & 7) == 1
+
+    def getFreePosition(self, positionStart = 0):
+        """
+        Gets the first free template position, using the occupancy bitmap.
+
+        Arguments:
+            positionStart (int): The position to start looking from
+
+        Returns:
+            The free position (int) or -1 if the database is full.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__getFreePosition(positionStart))
+
+    def __getFreePosition(self, positionStart = 0, positionEnd = -1):
+        """
+        Command of `getFreePosition()`.
+
+        Arguments:
+            positionStart (int): The position to start looking from
+            positionEnd (int): The position to stop looking before, -1 for the storage capacity
+        """
+
+        yield from self.__loadTemplateIndex()
+
+        templateIndex = self.__templateIndex
+        capacity = yield from self.__getStorageCapacity()
+
+        if ( positionEnd >= 0 ):
+            capacity = min(capacity, positionEnd)
+
+        ## All bytes before the hint are known to be full
+        updateHint = (positionStart >> 3) <= self.__freeHint
+        i = max(positionStart >> 3, self.__freeHint)
+
+        while ( i < len(templateIndex) and (i << 3) < capacity ):
+            pageElement = templateIndex[i]
+
+            if ( pageElement != 0xFF ):
+                if ( updateHint ):
+                    self.__freeHint = i
+                    updateHint = False
+
+                for p in range(0, 7 + 1):
+                    position = (i << 3) + p
+
+                    if ( position >= positionStart and position < capacity and self.__bitAtPosition(pageElement, p) == 0 ):
+                        return position
+
+            i += 1
+
+        return -1
+
+    def getTemplateIndex(self, page):
+        """
+        Gets a list of the template positions with usage indicator.
+
+        Arguments:
+            page (int): The page (value between 0 and 3, higher on sensors with more than 1024 positions).
+
+        Returns:
+            The list.
+
+        Raises:
+            ValueError: if passed page is invalid
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__getTemplateIndex(page))
+
+    def __getTemplateIndex(self, page):
+        """Command of `getTemplateIndex()`."""
+
+        ## The page bytes are only valid until the next packet, so get the capacity first
+        capacity = None
+
+        if ( self.__templateIndex is not None ):
+            capacity = yield from self.__getStorageCapacity()
+
+        pageElements = yield from self.__readTemplateIndexPage(page)
+
+        ## Keep the occupancy bitmap in sync
+        if ( capacity is not None and page * FINGERPRINT_TEMPLATEINDEX_PAGEBYTES < len(self.__templateIndex) ):
+            self.__copyTemplateIndexPage(page, pageElements, capacity)
+
+        templateIndex = []
+
+        for pageElement in pageElements:
+            ## Test every bit (bit = template position is used indicator) of a table page element
+            for p in range(0, 7 + 1):
+                positionIsUsed = (self.__bitAtPosition(pageElement, p) == 1)
+                templateIndex.append(positionIsUsed)
+
+        return templateIndex
+
     def getTemplateCount(self):
         """
         Gets the number of stored templates.
 
+        When the occupancy bitmap is loaded (see `refreshTemplateIndex()`) the
+        count is answered from it without querying the sensor.
+
         Returns:
             The template count (int).
 
@@ -807,12 +1647,20 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__getTemplateCount())
+
+    def __getTemplateCount(self):
+        """Command of `getTemplateCount()`."""
+
+        if ( self.__templateIndex is not None ):
+            return self.__templateCount
+
         packetPayload = (
             FINGERPRINT_TEMPLATECOUNT,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -832,10 +1680,13 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def readImage(self):
+    def readImage(self, timeout = None):
         """
         Reads the image of a finger and stores it in image buffer.
 
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
         Returns:
             True if image was read successfully or False otherwise.
 
@@ -843,12 +1694,17 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__readImage(), timeout = timeout)
+
+    def __readImage(self):
+        """Command of `readImage()`."""
+
         packetPayload = (
             FINGERPRINT_READIMAGE,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -873,12 +1729,13 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def convertImage(self, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+    def convertImage(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, timeout = None):
         """
         Converts the image in image buffer to characteristics and stores it in specified char buffer.
 
         Arguments:
             charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
             True if successful or False otherwise.
@@ -888,6 +1745,55 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__convertImage(charBufferNumber), timeout = timeout)
+
+    def __convertImage(self, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+        """Command of `convertImage()`."""
+
+        status = yield from self.__convertImageStatus(charBufferNumber)
+
+        if ( status != FINGERPRINT_OK ):
+            raise self.__convertImageError(status)
+
+        return True
+
+    def __convertImageError(self, status):
+        """
+        Creates the exception for a failed image conversion.
+
+        Arguments:
+            status (int): The status code of the conversion
+
+        Returns:
+            The exception.
+        """
+
+        if ( status == FINGERPRINT_ERROR_MESSYIMAGE ):
+            return Exception('The image is too messy')
+
+        elif ( status == FINGERPRINT_ERROR_FEWFEATUREPOINTS ):
+            return Exception('The image contains too few feature points')
+
+        else:
+            return Exception('The image is invalid')
+
+    def __convertImageStatus(self, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+        """
+        Converts the image in image buffer to characteristics and stores it in specified char buffer.
+
+        Arguments:
+            charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+
+        Returns:
+            The status code (int): `FINGERPRINT_OK` if successful, otherwise
+            `FINGERPRINT_ERROR_MESSYIMAGE`, `FINGERPRINT_ERROR_FEWFEATUREPOINTS`
+            or `FINGERPRINT_ERROR_INVALIDIMAGE`.
+
+        Raises:
+            ValueError: if passed char buffer is invalid
+            Exception: if any other error occurs
+        """
+
         if ( charBufferNumber != FINGERPRINT_CHARBUFFER1 and charBufferNumber != FINGERPRINT_CHARBUFFER2 ):
             raise ValueError('The given char buffer number is invalid!')
 
@@ -896,8 +1802,8 @@ class PyFingerprint(object):
             charBufferNumber,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -905,30 +1811,27 @@ class PyFingerprint(object):
         if ( receivedPacketType != FINGERPRINT_ACKPACKET ):
             raise Exception('The received packet is no ack packet!')
 
-        ## DEBUG: Image converted
-        if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
-            return True
+        ## DEBUG: Image converted or could not be converted
+        if ( receivedPacketPayload[0] == FINGERPRINT_OK or
+             receivedPacketPayload[0] == FINGERPRINT_ERROR_MESSYIMAGE or
+             receivedPacketPayload[0] == FINGERPRINT_ERROR_FEWFEATUREPOINTS or
+             receivedPacketPayload[0] == FINGERPRINT_ERROR_INVALIDIMAGE ):
+            return receivedPacketPayload[0]
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
             raise Exception('Communication error')
 
-        elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_MESSYIMAGE ):
-            raise Exception('The image is too messy')
-
-        elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_FEWFEATUREPOINTS ):
-            raise Exception('The image contains too few feature points')
-
-        elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_INVALIDIMAGE ):
-            raise Exception('The image is invalid')
-
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def createTemplate(self):
+    def createTemplate(self, timeout = None):
         """
         Combines the characteristics which are stored in char buffer 1 and char buffer 2 into one template.
         The created template will be stored again in char buffer 1 and char buffer 2 as the same.
 
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
         Returns:
             True if successful or False otherwise.
 
@@ -936,12 +1839,17 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__createTemplate(), timeout = timeout)
+
+    def __createTemplate(self):
+        """Command of `createTemplate()`."""
+
         packetPayload = (
             FINGERPRINT_CREATETEMPLATE,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -963,38 +1871,177 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def storeTemplate(self, positionNumber = -1, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+    def definePartition(self, name, positionStart, count):
+        """
+        Defines a named range of template positions, e.g. for a door group or tenant.
+
+        Templates stored with `storeTemplate(partition=name)` are allocated
+        inside the range and `searchTemplate(partition=name)` only searches
+        the part of the range that holds templates.
+
+        The range is checked against the storage capacity if the system
+        parameters are cached already, otherwise by the first command that
+        uses the partition. No command is sent to the sensor, so this also
+        works on `PyFingerprintAsync`.
+
+        Arguments:
+            name (str): The partition name
+            positionStart (int): The first position of the partition
+            count (int): The number of positions
+
+        Raises:
+            ValueError: if the range is invalid or overlaps another partition
+            Exception: if any error occurs
+        """
+
+        if ( positionStart < 0x0000 or count <= 0 ):
+            raise ValueError('The given position range is invalid!')
+
+        if ( self.__systemParameters is not None and positionStart + count > self.__systemParameters[2] ):
+            raise ValueError('The given position range is invalid!')
+
+        for otherName in self.__partitions:
+            otherStart, otherCount = self.__partitions[otherName]
+
+            if ( otherName != name and positionStart < otherStart + otherCount and otherStart < positionStart + count ):
+                raise ValueError('The given position range overlaps partition ' + str(otherName) + '!')
+
+        self.__partitions[name] = (positionStart, count)
+
+    def removePartition(self, name):
+        """
+        Removes a partition definition. The stored templates are kept.
+
+        Arguments:
+            name (str): The partition name
+        """
+
+        self.__partitions.pop(name, None)
+
+    def getPartition(self, name):
+        """
+        Gets the range of a partition.
+
+        Arguments:
+            name (str): The partition name
+
+        Returns:
+            A tuple that contain the following information:
+            0: integer The first position of the partition.
+            1: integer The number of positions.
+
+        Raises:
+            ValueError: if the partition is not defined
+        """
+
+        try:
+            return self.__partitions[name]
+
+        except KeyError:
+            raise ValueError('The given partition is not defined!')
+
+    def __getPartitionRange(self, name):
+        """
+        Gets the range of a partition and checks it against the storage capacity.
+
+        Arguments:
+            name (str): The partition name
+
+        Returns:
+            The tuple described in `getPartition()`.
+
+        Raises:
+            ValueError: if the partition is not defined or exceeds the storage capacity
+        """
+
+        positionStart, count = self.getPartition(name)
+
+        if ( positionStart + count > (yield from self.__getStorageCapacity()) ):
+            raise ValueError('The range of partition ' + str(name) + ' exceeds the storage capacity!')
+
+        return (positionStart, count)
+
+    def __getOccupiedExtent(self, positionStart, count):
+        """
+        Narrows a position range to the part from the first to the last used position, using the occupancy bitmap.
+
+        Arguments:
+            positionStart (int): The first position of the range
+            count (int): The number of positions
+
+        Returns:
+            A tuple (positionStart, count). The count is 0 if no position in the range is used.
+        """
+
+        templateIndex = self.__templateIndex
+        first = -1
+        last = -1
+
+        ## Positions beyond the bitmap do not exist and are never used
+        position = max(0, positionStart)
+        end = min(positionStart + count, len(templateIndex) << 3)
+
+        while ( position < end ):
+            pageElement = templateIndex[position >> 3]
+
+            ## Skip whole free bytes
+            if ( pageElement == 0 and (position & 7) == 0 and position + 8 <= end ):
+                position += 8
+                continue
+
+            if ( self.__bitAtPosition(pageElement, position & 7) == 1 ):
+                if ( first < 0 ):
+                    first = position
+                last = position
+
+            position += 1
+
+        if ( first < 0 ):
+            return (positionStart, 0)
+
+        return (first, last - first + 1)
+
+    def storeTemplate(self, positionNumber = -1, charBufferNumber = FINGERPRINT_CHARBUFFER1, partition = None, timeout = None):
         """
         Stores a template from the specified char buffer at the given position.
 
         Arguments:
-            positionNumber (int): The position
+            positionNumber (int): The position, -1 to use the first free position
             charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+            partition (str): Optional partition the position must belong to, see `definePartition()`
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
             The position number (int) of the stored template.
 
         Raises:
-            ValueError: if passed position or char buffer is invalid
-            Exception: if any error occurs
+            ValueError: if passed position, char buffer or partition is invalid
+            Exception: if no position is given and the database (or partition) is full, or any other error occurs
         """
 
+        return self._execute(self.__storeTemplate(positionNumber, charBufferNumber, partition), timeout = timeout)
+
+    def __storeTemplate(self, positionNumber = -1, charBufferNumber = FINGERPRINT_CHARBUFFER1, partition = None):
+        """Command of `storeTemplate()`."""
+
+        if ( partition is None ):
+            positionStart = 0
+            positionEnd = yield from self.__getStorageCapacity()
+        else:
+            positionStart, count = yield from self.__getPartitionRange(partition)
+            positionEnd = positionStart + count
+
         ## Find a free index
         if ( positionNumber == -1 ):
-            for page in range(0, 4):
-                ## Free index found?
-                if ( positionNumber >= 0 ):
-                    break
-
-                templateIndex = self.getTemplateIndex(page)
+            positionNumber = yield from self.__getFreePosition(positionStart, positionEnd)
 
-                for i in range(0, len(templateIndex)):
-                    ## Index not used?
-                    if ( templateIndex[i] is False ):
-                        positionNumber = (len(templateIndex) * page) + i
-                        break
+            if ( positionNumber == -1 ):
+                if ( partition is None ):
+                    raise Exception('The database is full')
+                else:
+                    raise Exception('The partition ' + partition + ' is full')
 
-        if ( positionNumber < 0x0000 or positionNumber >= self.getStorageCapacity() ):
+        if ( positionNumber < positionStart or positionNumber >= positionEnd ):
             raise ValueError('The given position number is invalid!')
 
         if ( charBufferNumber != FINGERPRINT_CHARBUFFER1 and charBufferNumber != FINGERPRINT_CHARBUFFER2 ):
@@ -1007,8 +2054,8 @@ class PyFingerprint(object):
             self.__rightShift(positionNumber, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1018,6 +2065,7 @@ class PyFingerprint(object):
 
         ## DEBUG: Template stored successful
         if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
+            self.__markTemplates(positionNumber, 1, True)
             return positionNumber
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
@@ -1032,14 +2080,20 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def searchTemplate(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, positionStart = 0, count = -1):
+    def searchTemplate(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, positionStart = 0, count = -1, partition = None, timeout = None):
         """
         Searches inside the database for the characteristics in char buffer.
 
+        When searching a partition, or the whole database while the occupancy
+        bitmap is loaded, only the positions from the first to the last used
+        one are searched. If none is used the sensor is not queried.
+
         Arguments:
             charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
             positionStart (int): The position to start the search
             count (int): The number of templates
+            partition (str): Optional partition to search instead of the given range, see `definePartition()`
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
             A tuple that contain the following information:
@@ -1050,13 +2104,29 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__searchTemplate(charBufferNumber, positionStart, count, partition), timeout = timeout)
+
+    def __searchTemplate(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, positionStart = 0, count = -1, partition = None):
+        """Command of `searchTemplate()`."""
+
         if ( charBufferNumber != FINGERPRINT_CHARBUFFER1 and charBufferNumber != FINGERPRINT_CHARBUFFER2 ):
             raise ValueError('The given charbuffer number is invalid!')
 
+        if ( partition is not None ):
+            positionStart, count = yield from self.__getPartitionRange(partition)
+            yield from self.__loadTemplateIndex()
+
         if ( count > 0 ):
             templatesCount = count
         else:
-            templatesCount = self.getStorageCapacity()
+            templatesCount = (yield from self.__getStorageCapacity()) - positionStart
+
+        ## Only search the occupied part of the range
+        if ( self.__templateIndex is not None ):
+            positionStart, templatesCount = self.__getOccupiedExtent(positionStart, templatesCount)
+
+            if ( templatesCount == 0 ):
+                return (-1, -1)
 
         packetPayload = (
             FINGERPRINT_SEARCHTEMPLATE,
@@ -1067,8 +2137,8 @@ class PyFingerprint(object):
             self.__rightShift(templatesCount, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1097,13 +2167,261 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def loadTemplate(self, positionNumber, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+    def __waitForFinger(self, present, deadline, touchPin = None, minInterval = 0, maxInterval = 0):
+        """
+        Reads images until a finger is placed on or removed from the sensor.
+
+        While the state does not change the time between two polls doubles
+        from `minInterval` up to `maxInterval`. If a touch pin is given it is
+        polled instead of the sensor until it reports a touch, and from then on
+        images are read every `minInterval`.
+
+        Arguments:
+            present (bool): True to wait for a finger, False to wait until it is removed
+            deadline (int): The deadline in `time.ticks_ms()` ticks, or None to wait forever
+            touchPin: Optional instance of machine.Pin connected to the touch output of the sensor, with value 1 while touched
+            minInterval (int): The shortest time in milliseconds between two polls
+            maxInterval (int): The longest time in milliseconds between two polls
+
+        Raises:
+            FingerprintTimeoutError: if the deadline has passed
+            Exception: if any error occurs
+        """
+
+        interval = minInterval
+
+        while ( True ):
+            touched = False
+
+            if ( touchPin is not None and present and touchPin.value() == 0 ):
+                pass
+
+            elif ( (yield from self.__readImage()) == present ):
+                return
+
+            else:
+                touched = touchPin is not None
+
+            if ( deadline is not None and ticks_diff(deadline, ticks_ms()) <= 0 ):
+                if ( present ):
+                    raise FingerprintTimeoutError('No finger was placed on the sensor in time')
+                else:
+                    raise FingerprintTimeoutError('The finger was not removed from the sensor in time')
+
+            ## Poll tightly once a touch is detected, back off otherwise
+            if ( touched ):
+                interval = minInterval
+
+            if ( interval > 0 ):
+                yield (_IDLE, interval)
+
+            if ( not touched ):
+                interval = min(interval * 2, maxInterval)
+
+    def enroll(self, positionNumber = -1, partition = None, timeout = None, checkDuplicate = True, touchPin = None,
+               minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL):
+        """
+        Enrolls a finger: reads and converts two images of it, combines them
+        into a template and stores the template.
+
+        The two images are compared by `createTemplate()` and the storage
+        capacity and free position come from the cached system parameters and
+        the occupancy bitmap, so no other commands are sent. The finger is
+        polled like in `identify()`.
+
+        Arguments:
+            positionNumber (int): The position, -1 to use the first free position
+            partition (str): Optional partition to store the template in, see `definePartition()`
+            timeout (int): Maximum time in milliseconds to wait for each finger placement and removal, or None to wait forever
+            checkDuplicate (bool): Search the first image in the database (or partition) and do not store the finger if it is already enrolled
+            touchPin: Optional instance of machine.Pin connected to the touch output of the sensor, with value 1 while touched
+            minInterval (int): The shortest time in milliseconds between two polls
+            maxInterval (int): The longest time in milliseconds between two polls
+
+        Returns:
+            A tuple that contain the following information:
+            0: integer(2 bytes) The position number of the stored template, or of the existing template if the finger is already enrolled.
+            1: boolean True if the template was stored or False if the finger is already enrolled.
+            2: dictionary The time in milliseconds spent in each stage, with the keys 'read1', 'convert1', 'search' (0 without `checkDuplicate`), 'release', 'read2', 'convert2', 'create' and 'store'.
+
+        Raises:
+            ValueError: if passed position or partition is invalid
+            FingerprintTimeoutError: if no finger is placed or removed in time
+            Exception: if the two images do not match or any other error occurs
+        """
+
+        return self._execute(self.__enroll(positionNumber, partition, timeout, checkDuplicate, touchPin, minInterval, maxInterval))
+
+    def __enroll(self, positionNumber = -1, partition = None, timeout = None, checkDuplicate = True, touchPin = None,
+                 minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL):
+        """Command of `enroll()`."""
+
+        timings = {}
+        stageStart = ticks_ms()
+
+        def stage(name):
+            nonlocal stageStart
+            now = ticks_ms()
+            timings[name] = ticks_diff(now, stageStart)
+            stageStart = now
+
+        yield from self.__waitForFinger(True, None if timeout is None else self.__deadline(timeout), touchPin, minInterval, maxInterval)
+        stage('read1')
+
+        yield from self.__convertImage(FINGERPRINT_CHARBUFFER1)
+        stage('convert1')
+
+        if ( checkDuplicate ):
+            result = yield from self.__searchTemplate(FINGERPRINT_CHARBUFFER1, partition = partition)
+            stage('search')
+
+            if ( result[0] >= 0 ):
+                return (result[0], False, timings)
+
+        else:
+            timings['search'] = 0
+
+        yield from self.__waitForFinger(False, None if timeout is None else self.__deadline(timeout), touchPin, minInterval, maxInterval)
+        stage('release')
+
+        yield from self.__waitForFinger(True, None if timeout is None else self.__deadline(timeout), touchPin, minInterval, maxInterval)
+        stage('read2')
+
+        yield from self.__convertImage(FINGERPRINT_CHARBUFFER2)
+        stage('convert2')
+
+        if ( not (yield from self.__createTemplate()) ):
+            raise Exception('The two images of the finger do not match')
+        stage('create')
+
+        positionNumber = yield from self.__storeTemplate(positionNumber, FINGERPRINT_CHARBUFFER1, partition)
+        stage('store')
+
+        return (positionNumber, True, timings)
+
+    def capture(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, attempts = FINGERPRINT_CAPTURE_ATTEMPTS, timeout = None, touchPin = None,
+                minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL):
+        """
+        Waits for a finger and converts its image into the char buffer. If the
+        image is too messy, has too few feature points or is invalid, the image
+        is read again until it converts, the attempts are used up or the
+        timeout has passed.
+
+        The finger is polled like in `identify()`.
+
+        Arguments:
+            charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+            attempts (int): The maximum number of images to read
+            timeout (int): Maximum time in milliseconds for all attempts, or None for no limit
+            touchPin: Optional instance of machine.Pin connected to the touch output of the sensor, with value 1 while touched
+            minInterval (int): The shortest time in milliseconds between two polls
+            maxInterval (int): The longest time in milliseconds between two polls
+
+        Returns:
+            A tuple that contain the following information:
+            0: boolean True if an image was converted or False otherwise.
+            1: dictionary The number of failed conversions by status code
+            (`FINGERPRINT_ERROR_MESSYIMAGE`, `FINGERPRINT_ERROR_FEWFEATUREPOINTS` or `FINGERPRINT_ERROR_INVALIDIMAGE`).
+
+        Raises:
+            ValueError: if passed char buffer or attempts are invalid
+            FingerprintTimeoutError: if no finger is placed in time
+            Exception: if any other error occurs
+        """
+
+        return self._execute(self.__capture(charBufferNumber, attempts, timeout, touchPin, minInterval, maxInterval))
+
+    def __capture(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, attempts = FINGERPRINT_CAPTURE_ATTEMPTS, timeout = None, touchPin = None,
+                  minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL):
+        """Command of `capture()`."""
+
+        status, errors = yield from self.__captureStatus(charBufferNumber, attempts, timeout, touchPin, minInterval, maxInterval)
+
+        return (status == FINGERPRINT_OK, errors)
+
+    def __captureStatus(self, charBufferNumber, attempts, timeout, touchPin, minInterval, maxInterval):
+        """
+        Reads and converts images like `capture()`.
+
+        Returns:
+            A tuple (status, errors) with the status code of the last conversion
+            and the number of failed conversions by status code.
+        """
+
+        if ( attempts < 1 ):
+            raise ValueError('The given attempts are invalid!')
+
+        deadline = None if timeout is None else self.__deadline(timeout)
+        errors = {}
+
+        while ( True ):
+            yield from self.__waitForFinger(True, deadline, touchPin, minInterval, maxInterval)
+            status = yield from self.__convertImageStatus(charBufferNumber)
+
+            if ( status == FINGERPRINT_OK ):
+                return (status, errors)
+
+            errors[status] = errors.get(status, 0) + 1
+            attempts -= 1
+
+            if ( attempts == 0 or (deadline is not None and ticks_diff(deadline, ticks_ms()) <= 0) ):
+                return (status, errors)
+
+    def identify(self, partition = None, timeout = None, touchPin = None,
+                 minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL,
+                 attempts = FINGERPRINT_CAPTURE_ATTEMPTS):
+        """
+        Waits for a finger, reads and converts its image into char buffer 1 and
+        searches for it in the database. Images that cannot be converted are
+        read again, see `capture()`.
+
+        While no finger is present the sensor is polled less and less often,
+        from every `minInterval` up to every `maxInterval` milliseconds. If the
+        touch output of the sensor is connected, pass its pin: it is polled
+        instead, without UART traffic, and the sensor is only read once it
+        reports a touch.
+
+        Arguments:
+            partition (str): Optional partition to search instead of the whole database, see `definePartition()`
+            timeout (int): Maximum time in milliseconds to wait for a finger, or None to wait forever
+            touchPin: Optional instance of machine.Pin connected to the touch output of the sensor, with value 1 while touched
+            minInterval (int): The shortest time in milliseconds between two polls
+            maxInterval (int): The longest time in milliseconds between two polls
+            attempts (int): The maximum number of images to read
+
+        Returns:
+            A tuple that contain the following information:
+            0: integer(2 bytes) The position number of found template.
+            1: integer(2 bytes) The accuracy score of found template.
+
+        Raises:
+            ValueError: if passed partition or attempts are invalid
+            FingerprintTimeoutError: if no finger is placed in time
+            Exception: if no image could be converted or any other error occurs
+        """
+
+        return self._execute(self.__identify(partition, timeout, touchPin, minInterval, maxInterval, attempts))
+
+    def __identify(self, partition = None, timeout = None, touchPin = None,
+                   minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL,
+                   attempts = FINGERPRINT_CAPTURE_ATTEMPTS):
+        """Command of `identify()`."""
+
+        status, errors = yield from self.__captureStatus(FINGERPRINT_CHARBUFFER1, attempts, timeout, touchPin, minInterval, maxInterval)
+
+        if ( status != FINGERPRINT_OK ):
+            raise self.__convertImageError(status)
+
+        return (yield from self.__searchTemplate(FINGERPRINT_CHARBUFFER1, partition = partition))
+
+    def loadTemplate(self, positionNumber, charBufferNumber = FINGERPRINT_CHARBUFFER1, timeout = None):
         """
         Loads an existing template specified by position number to specified char buffer.
 
         Arguments:
             positionNumber (int): The position
             charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
             True if successful or False otherwise.
@@ -1113,7 +2431,12 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        if ( positionNumber < 0x0000 or positionNumber >= self.getStorageCapacity() ):
+        return self._execute(self.__loadTemplate(positionNumber, charBufferNumber), timeout = timeout)
+
+    def __loadTemplate(self, positionNumber, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+        """Command of `loadTemplate()`."""
+
+        if ( positionNumber < 0x0000 or positionNumber >= (yield from self.__getStorageCapacity()) ):
             raise ValueError('The given position number is invalid!')
 
         if ( charBufferNumber != FINGERPRINT_CHARBUFFER1 and charBufferNumber != FINGERPRINT_CHARBUFFER2 ):
@@ -1126,8 +2449,8 @@ class PyFingerprint(object):
             self.__rightShift(positionNumber, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1151,13 +2474,14 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def deleteTemplate(self, positionNumber, count = 1):
+    def deleteTemplate(self, positionNumber, count = 1, timeout = None):
         """
         Deletes templates from fingerprint database. Per default one.
 
         Arguments:
             positionNumber (int): The position
             count (int): The number of templates to be deleted.
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
             True if successful or False otherwise.
@@ -1167,7 +2491,12 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
-        capacity = self.getStorageCapacity()
+        return self._execute(self.__deleteTemplate(positionNumber, count), timeout = timeout)
+
+    def __deleteTemplate(self, positionNumber, count = 1):
+        """Command of `deleteTemplate()`."""
+
+        capacity = yield from self.__getStorageCapacity()
 
         if ( positionNumber < 0x0000 or positionNumber >= capacity ):
             raise ValueError('The given position number is invalid!')
@@ -1183,8 +2512,8 @@ class PyFingerprint(object):
             self.__rightShift(count, 0),
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1194,6 +2523,7 @@ class PyFingerprint(object):
 
         ## DEBUG: Template deleted successful
         if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
+            self.__markTemplates(positionNumber, count, False)
             return True
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
@@ -1209,10 +2539,13 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def clearDatabase(self):
+    def clearDatabase(self, timeout = None):
         """
         Deletes all templates from the fingeprint database.
 
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
         Returns:
             True if successful or False otherwise.
 
@@ -1220,12 +2553,17 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__clearDatabase(), timeout = timeout)
+
+    def __clearDatabase(self):
+        """Command of `clearDatabase()`."""
+
         packetPayload = (
             FINGERPRINT_CLEARDATABASE,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1235,6 +2573,10 @@ class PyFingerprint(object):
 
         ## DEBUG: Database cleared successful
         if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
+            if ( self.__templateIndex is not None ):
+                self.__templateIndex = bytearray(len(self.__templateIndex))
+                self.__templateCount = 0
+                self.__freeHint = 0
             return True
 
         elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
@@ -1247,10 +2589,121 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def compareCharacteristics(self):
+    def compactTemplates(self, steps = -1, charBufferNumber = FINGERPRINT_CHARBUFFER2, partition = None):
+        """
+        Moves templates down into the free positions before them, so the used
+        positions form a contiguous block at the start of the range.
+
+        Each step moves the last used template of the range into the first free
+        position with `loadTemplate()`, `storeTemplate()` and `deleteTemplate()`.
+        The compaction can be done incrementally, e.g. during idle time, by
+        calling it repeatedly with a small number of steps until it returns an
+        empty remap.
+
+        Without a partition, every defined partition and every range between
+        them is compacted on its own, so no template leaves its partition.
+
+        Note: The given char buffer is overwritten.
+
+        Arguments:
+            steps (int): The maximum number of templates to move (at least 1), -1 for no limit
+            charBufferNumber (int): The char buffer used to move the templates. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+            partition (str): Optional partition to compact instead of the whole database, see `definePartition()`
+
+        Returns:
+            A dictionary that maps the old position (int) of every moved template to its new position (int).
+
+        Raises:
+            ValueError: if passed steps, char buffer or partition is invalid
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__compactTemplates(steps, charBufferNumber, partition))
+
+    def __compactTemplates(self, steps = -1, charBufferNumber = FINGERPRINT_CHARBUFFER2, partition = None):
+        """Command of `compactTemplates()`."""
+
+        if ( steps == 0 or steps < -1 ):
+            raise ValueError('The given number of steps is invalid!')
+
+        if ( partition is not None ):
+            positionStart, count = yield from self.__getPartitionRange(partition)
+            ranges = [(positionStart, count, partition)]
+
+        else:
+            ## Every partition and every gap between them, in position order
+            ranges = []
+            position = 0
+
+            for name in sorted(self.__partitions, key = lambda name: self.__partitions[name][0]):
+                positionStart, count = yield from self.__getPartitionRange(name)
+
+                if ( position < positionStart ):
+                    ranges.append((position, positionStart - position, None))
+
+                ranges.append((positionStart, count, name))
+                position = positionStart + count
+
+            capacity = yield from self.__getStorageCapacity()
+
+            if ( position < capacity ):
+                ranges.append((position, capacity - position, None))
+
+        yield from self.__loadTemplateIndex()
+
+        remap = {}
+
+        for positionStart, count, name in ranges:
+            yield from self.__compactRange(positionStart, count, name, steps, charBufferNumber, remap)
+
+        return remap
+
+    def __compactRange(self, positionStart, count, partition, steps, charBufferNumber, remap):
+        """
+        Compacts one range of positions, see `compactTemplates()`.
+
+        Arguments:
+            positionStart (int): The first position of the range
+            count (int): The number of positions
+            partition (str): The partition of the range, or None
+            steps (int): The maximum number of templates to move in total, -1 for no limit
+            charBufferNumber (int): The char buffer used to move the templates
+            remap (dict): The moves so far, the moves of this range are added
+        """
+
+        templateIndex = self.__templateIndex
+        freePosition = positionStart
+        usedPosition = positionStart + count - 1
+
+        while ( steps < 0 or len(remap) < steps ):
+
+            ## Find the first free and the last used position
+            while ( freePosition <= usedPosition and self.__bitAtPosition(templateIndex[freePosition >> 3], freePosition & 7) == 1 ):
+                freePosition += 1
+
+            while ( usedPosition > freePosition and self.__bitAtPosition(templateIndex[usedPosition >> 3], usedPosition & 7) == 0 ):
+                usedPosition -= 1
+
+            if ( usedPosition <= freePosition ):
+                break
+
+            if ( not (yield from self.__loadTemplate(usedPosition, charBufferNumber)) ):
+                raise Exception('The template at position ' + str(usedPosition) + ' could not be loaded')
+
+            yield from self.__storeTemplate(freePosition, charBufferNumber, partition)
+
+            if ( not (yield from self.__deleteTemplate(usedPosition)) ):
+                raise Exception('The template at position ' + str(usedPosition) + ' could not be deleted')
+
+            remap[usedPosition] = freePosition
+
+    def compareCharacteristics(self, timeout = None):
         """
         Compare the finger characteristics of char buffer 1 with char buffer 2 and returns the accuracy score.
 
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
         Returns:
             The accuracy score (int). 0 means fingers are not the same.
 
@@ -1258,12 +2711,17 @@ class PyFingerprint(object):
             Exception: if any error occurs
         """
 
+        return self._execute(self.__compareCharacteristics(), timeout = timeout)
+
+    def __compareCharacteristics(self):
+        """Command of `compareCharacteristics()`."""
+
         packetPayload = (
             FINGERPRINT_COMPARECHARACTERISTICS,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1287,7 +2745,7 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-    def uploadCharacteristics(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, characteristicsData = [0]):
+    def uploadCharacteristics(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, characteristicsData = [0], verify = True, timeout = None):
         """
         Uploads finger characteristics to specified char buffer.
 
@@ -1296,23 +2754,37 @@ class PyFingerprint(object):
 
         Arguments:
             charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
-            characteristicsData (list): The characteristics
+            characteristicsData: The characteristics, as bytes, bytearray,
+            memoryview or a list of ints. Buffers are sent in slices without
+            being copied.
+            verify (bool): Read the characteristics back and compare them. The
+            sensor does not acknowledge data packets, so this doubles the
+            transfer time.
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
-            True if everything is right.
+            True if everything is right (always True if not verified).
 
         Raises:
             ValueError: if passed char buffer or characteristics are invalid
             Exception: if any error occurs
         """
 
+        return self._execute(self.__uploadCharacteristics(charBufferNumber, characteristicsData, verify), timeout = timeout)
+
+    def __uploadCharacteristics(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, characteristicsData = [0], verify = True):
+        """Command of `uploadCharacteristics()`."""
+
         if ( charBufferNumber != FINGERPRINT_CHARBUFFER1 and charBufferNumber != FINGERPRINT_CHARBUFFER2 ):
             raise ValueError('The given char buffer number is invalid!')
 
-        if ( characteristicsData == [0] ):
+        if ( characteristicsData == [0] or len(characteristicsData) == 0 ):
             raise ValueError('The characteristics data is required!')
 
-        maxPacketSize = self.getMaxPacketSize()
+        if ( not isinstance(characteristicsData, (bytes, bytearray, memoryview)) ):
+            characteristicsData = bytes(characteristicsData)
+
+        maxPacketSize = yield from self.__getMaxPacketSize()
 
         ## Upload command
 
@@ -1321,10 +2793,10 @@ class PyFingerprint(object):
             charBufferNumber
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
 
         ## Get first reply packet
-        receivedPacket = self.__readPacket()
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1346,25 +2818,158 @@ class PyFingerprint(object):
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
         ## Upload data packets
-        packetNbr = len(characteristicsData) / maxPacketSize
+        characteristicsView = memoryview(characteristicsData)
+        characteristicsLength = len(characteristicsView)
 
-        if ( packetNbr <= 1 ):
-            self.__writePacket(FINGERPRINT_ENDDATAPACKET, characteristicsData)
-        else:
-            i = 1
-            while ( i < packetNbr ):
-                lfrom = (i-1) * maxPacketSize
-                lto = lfrom + maxPacketSize
-                self.__writePacket(FINGERPRINT_DATAPACKET, characteristicsData[lfrom:lto])
-                i += 1
-
-            lfrom = (i-1) * maxPacketSize
+        for lfrom in range(0, characteristicsLength, maxPacketSize):
             lto = lfrom + maxPacketSize
-            self.__writePacket(FINGERPRINT_ENDDATAPACKET, characteristicsData[lfrom:lto])
+
+            if ( lto >= characteristicsLength ):
+                packetType = FINGERPRINT_ENDDATAPACKET
+            else:
+                packetType = FINGERPRINT_DATAPACKET
+
+            yield from self.__writePacket(packetType, characteristicsView[lfrom:lto])
+
+        if ( not verify ):
+            return True
 
         ## Verify uploaded characteristics
-        characterics = self.downloadCharacteristics(charBufferNumber)
-        return (characterics == characteristicsData)
+        characterics = bytearray(characteristicsLength)
+
+        try:
+            yield from self.__downloadCharacteristics(charBufferNumber, characterics)
+
+        except ValueError:
+            ## The sensor holds more data than was uploaded
+            return False
+
+        return (characterics == bytes(characteristicsData))
+
+    def uploadTemplates(self, templates, verify = False):
+        """
+        Uploads and stores many templates in one go.
+
+        Every template is uploaded to char buffer 1 and stored with
+        `storeTemplate()`. Without verification each template costs two
+        round trips plus its data packets.
+
+        Arguments:
+            templates: An iterable of (positionNumber, characteristicsData)
+            tuples. Use position -1 to store at the first free position.
+            verify (bool): Read every template back after uploading, see `uploadCharacteristics()`.
+
+        Returns:
+            The list of positions (int) the templates were stored at.
+
+        Raises:
+            ValueError: if any passed position or characteristics are invalid
+            Exception: if a template fails verification or any error occurs
+        """
+
+        return self._execute(self.__uploadTemplates(templates, verify))
+
+    def __uploadTemplates(self, templates, verify = False):
+        """Command of `uploadTemplates()`."""
+
+        positions = []
+
+        for positionNumber, characteristicsData in templates:
+            if ( not (yield from self.__uploadCharacteristics(FINGERPRINT_CHARBUFFER1, characteristicsData, verify)) ):
+                raise Exception('The uploaded characteristics do not match!')
+
+            positions.append((yield from self.__storeTemplate(positionNumber, FINGERPRINT_CHARBUFFER1)))
+
+        return positions
+
+    def exportTemplate(self, positionNumber, buffer = None):
+        """
+        Downloads the template stored at the given position.
+
+        The template is loaded into char buffer 1 and downloaded from there.
+
+        Arguments:
+            positionNumber (int): The position
+            buffer (bytearray): Optional preallocated buffer to store the template in
+
+        Returns:
+            The template (bytes), or a memoryview of the filled part of the buffer.
+
+        Raises:
+            ValueError: if passed position is invalid or the buffer is too small
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__exportTemplate(positionNumber, buffer))
+
+    def __exportTemplate(self, positionNumber, buffer = None):
+        """Command of `exportTemplate()`."""
+
+        yield from self.__loadTemplate(positionNumber, FINGERPRINT_CHARBUFFER1)
+
+        if ( buffer is None ):
+            characteristics = io.BytesIO()
+            yield from self.__downloadCharacteristics(FINGERPRINT_CHARBUFFER1, characteristics)
+            return characteristics.getvalue()
+
+        length = yield from self.__downloadCharacteristics(FINGERPRINT_CHARBUFFER1, buffer)
+        return memoryview(buffer)[:length]
+
+    def exportTemplates(self, buffer = None):
+        """
+        Downloads all stored templates, one at a time.
+
+        Only positions marked as used in the template index are visited. Each
+        template is downloaded when the generator is advanced, so the
+        database is never held in memory as a whole.
+
+        Arguments:
+            buffer (bytearray): Optional preallocated buffer reused for every
+            template. The yielded data is then only valid until the next
+            template is downloaded.
+
+        Returns:
+            A generator of (positionNumber, template) tuples, see `exportTemplate()`.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        templateIndex = self.getTemplateBitmap()
+
+        for i in range(0, len(templateIndex)):
+            ## Skip 8 free positions at once
+            if ( templateIndex[i] == 0 ):
+                continue
+
+            for p in range(0, 7 + 1):
+                if ( self.__bitAtPosition(templateIndex[i], p) == 1 ):
+                    positionNumber = (i << 3) + p
+                    yield (positionNumber, self.exportTemplate(positionNumber, buffer))
+
+    def importTemplates(self, templates, clear = False):
+        """
+        Stores templates, e.g. as produced by `exportTemplates()`.
+
+        Templates are consumed from the iterable one at a time, so an export
+        from another sensor can be piped straight in.
+
+        Arguments:
+            templates: An iterable of (positionNumber, characteristicsData) tuples
+            clear (bool): Delete all stored templates first
+
+        Returns:
+            The list of positions (int) the templates were stored at.
+
+        Raises:
+            ValueError: if any passed position or characteristics are invalid
+            Exception: if any error occurs
+        """
+
+        if ( clear ):
+            self.clearDatabase()
+
+        return self.uploadTemplates(templates)
 
     def generateRandomNumber(self):
         """
@@ -1379,12 +2984,18 @@ class PyFingerprint(object):
         Raises:
             Exception: if any error occurs
         """
+
+        return self._execute(self.__generateRandomNumber())
+
+    def __generateRandomNumber(self):
+        """Command of `generateRandomNumber()`."""
+
         packetPayload = (
             FINGERPRINT_GENERATERANDOMNUMBER,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1408,22 +3019,144 @@ class PyFingerprint(object):
         number = number | self.__leftShift(receivedPacketPayload[4], 0)
         return number
 
-    def downloadCharacteristics(self, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+    def __readDataPackets(self, buffer):
+        """
+        Receives follow-up data packets until the end data packet and stores their payloads.
+
+        Arguments:
+            buffer: A bytearray (or other writable buffer) to fill, or a stream
+            with a `write()` method such as a file
+
+        Returns:
+            The number of bytes received (int).
+
+        Raises:
+            ValueError: if the data does not fit into the buffer
+            Exception: if any error occurs
+        """
+
+        if ( hasattr(buffer, 'write') ):
+            stream = buffer
+            view = None
+        else:
+            stream = None
+            view = memoryview(buffer)
+
+        receivedPacketType = None
+        received = 0
+        overflow = False
+
+        ## Get follow-up data packets until the last data packet is received
+        while ( receivedPacketType != FINGERPRINT_ENDDATAPACKET ):
+
+            receivedPacket = yield from self.__readPacket()
+
+            receivedPacketType = receivedPacket[0]
+            receivedPacketPayload = receivedPacket[1]
+
+            if ( receivedPacketType != FINGERPRINT_DATAPACKET and receivedPacketType != FINGERPRINT_ENDDATAPACKET ):
+                raise Exception('The received packet is no data packet!')
+
+            length = len(receivedPacketPayload)
+
+            if ( stream is not None ):
+                stream.write(receivedPacketPayload)
+
+            ## Keep reading when the buffer is full, so no packets are left behind
+            elif ( received + length > len(view) ):
+                overflow = True
+
+            else:
+                view[received:received + length] = receivedPacketPayload
+
+            received += length
+
+        if ( overflow ):
+            raise ValueError('The given buffer is too small ({} bytes received)!'.format(received))
+
+        return received
+
+    def downloadImage(self, buffer, timeout = None):
+        """
+        Downloads the image of a finger from the image buffer.
+
+        The image data (two 4-bit pixels per byte, 36864 bytes for a 256x288
+        sensor) is stored packet by packet as it is received, so the whole
+        image is never held in memory unless the buffer is a bytearray.
+
+        Arguments:
+            buffer: A preallocated bytearray (or other writable buffer) large
+            enough for the image, or a stream with a `write()` method such as
+            a file opened in binary mode
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
+        Returns:
+            The number of bytes received (int).
+
+        Raises:
+            ValueError: if the image does not fit into the buffer
+            Exception: if any error occurs
+        """
+
+        return self._execute(self.__downloadImage(buffer), timeout = timeout)
+
+    def __downloadImage(self, buffer):
+        """Command of `downloadImage()`."""
+
+        packetPayload = (
+            FINGERPRINT_DOWNLOADIMAGE,
+        )
+
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+
+        ## Get first reply packet
+        receivedPacket = yield from self.__readPacket()
+
+        receivedPacketType = receivedPacket[0]
+        receivedPacketPayload = receivedPacket[1]
+
+        if ( receivedPacketType != FINGERPRINT_ACKPACKET ):
+            raise Exception('The received packet is no ack packet!')
+
+        ## DEBUG: The sensor will sent follow-up packets
+        if ( receivedPacketPayload[0] == FINGERPRINT_OK ):
+            pass
+
+        elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_COMMUNICATION ):
+            raise Exception('Communication error')
+
+        elif ( receivedPacketPayload[0] == FINGERPRINT_ERROR_DOWNLOADIMAGE ):
+            raise Exception('Could not download image')
+
+        else:
+            raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
+
+        return (yield from self.__readDataPackets(buffer))
+
+    def downloadCharacteristics(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, buffer = None, timeout = None):
         """
         Downloads the finger characteristics from the specified char buffer.
 
         Arguments:
             charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
-            characteristicsData (list): The characteristics
+            buffer: Optional preallocated bytearray (typically 512 bytes) or
+            stream with a `write()` method to store the characteristics in
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
 
         Returns:
-            The characteristics (list).
+            The characteristics (list) if no buffer is given, otherwise the
+            number of bytes stored in the buffer (int).
 
         Raises:
-            ValueError: if passed char buffer is invalid
+            ValueError: if passed char buffer is invalid or the buffer is too small
             Exception: if any error occurs
         """
 
+        return self._execute(self.__downloadCharacteristics(charBufferNumber, buffer), timeout = timeout)
+
+    def __downloadCharacteristics(self, charBufferNumber = FINGERPRINT_CHARBUFFER1, buffer = None):
+        """Command of `downloadCharacteristics()`."""
+
         if ( charBufferNumber != FINGERPRINT_CHARBUFFER1 and charBufferNumber != FINGERPRINT_CHARBUFFER2 ):
             raise ValueError('The given char buffer number is invalid!')
 
@@ -1432,10 +3165,10 @@ class PyFingerprint(object):
             charBufferNumber,
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
 
         ## Get first reply packet
-        receivedPacket = self.__readPacket()
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1456,35 +3189,34 @@ class PyFingerprint(object):
         else:
             raise Exception('Unknown error '+ hex(receivedPacketPayload[0]))
 
-        completePayload = []
-
-        ## Get follow-up data packets until the last data packet is received
-        while ( receivedPacketType != FINGERPRINT_ENDDATAPACKET ):
-
-            receivedPacket = self.__readPacket()
-
-            receivedPacketType = receivedPacket[0]
-            receivedPacketPayload = receivedPacket[1]
-
-            if ( receivedPacketType != FINGERPRINT_DATAPACKET and receivedPacketType != FINGERPRINT_ENDDATAPACKET ):
-                raise Exception('The received packet is no data packet!')
+        if ( buffer is not None ):
+            return (yield from self.__readDataPackets(buffer))
 
-            for i in range(0, len(receivedPacketPayload)):
-                completePayload.append(receivedPacketPayload[i])
+        completePayload = io.BytesIO()
+        yield from self.__readDataPackets(completePayload)
 
-        return completePayload
+        return list(completePayload.getvalue())
 
-    def softReset(self):
+    def softReset(self, timeout=None):
         """Soft reset the sensor.
 
         Author:
             Chris Borrill <chris.borrill@gmail.com>
+
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
         """
+
+        return self._execute(self.__softReset(), timeout=timeout)
+
+    def __softReset(self):
+        """Command of `softReset()`."""
+
         packetPayload = (
             FINGERPRINT_SOFT_RESET,
         )
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1496,23 +3228,40 @@ class PyFingerprint(object):
             raise Exception('Unknown error ' + hex(receivedPacketPayload[0]))
 
         # Wait for handshake on reset completion
-        while(self.__serial.read(1) != b'U'):
-            pass
+        deadline = self.__deadline(None)
+
+        while (True):
+            yield (_READ, self.__rxView[:1], deadline)
+
+            if (self.__recorder is not None):
+                self.__recorder.bytesReceived(self.__rxView[:1])
 
-    def checkSensor(self):
+            if (self.__rxBuffer[0] == 0x55):
+                break
+
+    def checkSensor(self, timeout=None):
         """Check the sensor is in a working state.
 
         Author:
             Chris Borrill <chris.borrill@gmail.com>
 
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
         Returns:
             True if the sensor is working correctly.
         """
+
+        return self._execute(self.__checkSensor(), timeout=timeout)
+
+    def __checkSensor(self):
+        """Command of `checkSensor()`."""
+
         packetPayload = (
             FINGERPRINT_CHECK_SENSOR,
         )
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1522,20 +3271,29 @@ class PyFingerprint(object):
 
         return receivedPacketPayload[0] == FINGERPRINT_OK
 
-    def handshake(self):
+    def handshake(self, timeout=None):
         """Hand shake with the sensor.
 
         Author:
             Chris Borrill <chris.borrill@gmail.com>
 
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for each packet of this call, or None to use the instance timeout
+
         Returns:
             True if the sensor is working normally.
         """
+
+        return self._execute(self.__handshake(), timeout=timeout)
+
+    def __handshake(self, timeout = None):
+        """Command of `handshake()`."""
+
         packetPayload = (
             FINGERPRINT_HANDSHAKE,
         )
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket(timeout)
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1545,17 +3303,167 @@ class PyFingerprint(object):
 
         return receivedPacketPayload[0] == FINGERPRINT_OK
 
+    def negotiate(self, baudRates = FINGERPRINT_NEGOTIATE_BAUDRATES, packetSizes = (64, 128, 256)):
+        """
+        Raises the baud rate and the maximum packet size of the link as far as
+        the sensor and the UART allow.
+
+        The baud rates above the current one are tried in order. For each the
+        sensor is set to it, the UART is reconfigured to match and the link is
+        checked with a hand shake. If the check fails, the UART is set back and
+        the sensor is set back to the last working rate. The packet sizes
+        above the current one are tried the same way, each checked by
+        uploading the content of char buffer 1 and downloading it again. The
+        char buffer is restored if the check fails.
+
+        Note: The UART must match the baud rate reported by `getBaudRate()`
+        when this is called.
+
+        Arguments:
+            baudRates (tuple): The baud rates to try, in ascending order. Each must be a multiple of 9600 up to 115200.
+            packetSizes (tuple): The packet sizes to try, in ascending order. 32, 64, 128 and 256 are supported.
+
+        Returns:
+            A tuple that contain the following information:
+            0: integer The baud rate used.
+            1: integer The maximum packet size used.
+
+        Raises:
+            ValueError: if a passed baud rate or packet size is invalid
+            Exception: if the link to the sensor is lost or any other error occurs
+        """
+
+        return self._execute(self.__negotiate(baudRates, packetSizes))
+
+    def __negotiate(self, baudRates = FINGERPRINT_NEGOTIATE_BAUDRATES, packetSizes = (64, 128, 256)):
+        """Command of `negotiate()`."""
+
+        packetSizeTypes = {32: 0, 64: 1, 128: 2, 256: 3}
+
+        for baudRate in baudRates:
+            if ( baudRate % 9600 != 0 or baudRate < 9600 or baudRate > 115200 ):
+                raise ValueError('The given baud rate is invalid!')
+
+        for packetSize in packetSizes:
+            if ( packetSize not in packetSizeTypes ):
+                raise ValueError('The given packet size is invalid!')
+
+        currentBaudRate = yield from self.__getBaudRate()
+
+        for baudRate in baudRates:
+            if ( baudRate <= currentBaudRate ):
+                continue
+
+            ## The sensor acknowledges with the old baud rate, then switches
+            yield from self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE, baudRate // 9600)
+
+            if ( (yield from self.__checkLink(baudRate)) ):
+                currentBaudRate = baudRate
+                continue
+
+            ## The sensor may only switch after a restart, keep it on the old rate
+            if ( not (yield from self.__checkLink(currentBaudRate)) ):
+                raise Exception('The link to the sensor was lost at ' + str(baudRate) + ' baud')
+
+            yield from self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE, currentBaudRate // 9600)
+            break
+
+        currentPacketSize = yield from self.__getMaxPacketSize()
+        characteristics = None
+
+        for packetSize in packetSizes:
+            if ( packetSize <= currentPacketSize ):
+                continue
+
+            ## Char buffer 1 is used for the checks, save it with the working packet size
+            if ( characteristics is None ):
+                characteristics = io.BytesIO()
+                yield from self.__downloadCharacteristics(FINGERPRINT_CHARBUFFER1, characteristics)
+                characteristics = characteristics.getvalue()
+
+            try:
+                yield from self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_PACKAGE_SIZE, packetSizeTypes[packetSize])
+
+            ## DEBUG: The sensor does not support the packet size
+            except Exception:
+                break
+
+            if ( not (yield from self.__checkPacketSize(characteristics)) ):
+                yield from self.__setSystemParameter(FINGERPRINT_SETSYSTEMPARAMETER_PACKAGE_SIZE, packetSizeTypes[currentPacketSize])
+                yield from self.__uploadCharacteristics(FINGERPRINT_CHARBUFFER1, characteristics, False)
+                break
+
+            currentPacketSize = packetSize
+
+        return (currentBaudRate, currentPacketSize)
+
+    def __checkPacketSize(self, characteristics):
+        """
+        Checks the link with data packets of the current maximum size, in
+        both directions: the characteristics are uploaded to char buffer 1
+        and downloaded again.
+
+        Arguments:
+            characteristics (bytes): The characteristics, e.g. the saved content of char buffer 1
+
+        Returns:
+            True if the characteristics came back unchanged or False otherwise.
+        """
+
+        try:
+            return (yield from self.__uploadCharacteristics(FINGERPRINT_CHARBUFFER1, characteristics, True))
+
+        except Exception:
+            ## Discard the rest of a broken transfer
+            yield (_SLEEP, FINGERPRINT_NEGOTIATE_TIMEOUT // 4)
+
+            while ( self.__serial.any() ):
+                self.__serial.read()
+
+            return False
+
+    def __checkLink(self, baudRate):
+        """
+        Reconfigures the UART and checks the link with a hand shake.
+
+        Arguments:
+            baudRate (int): The baud rate
+
+        Returns:
+            True if the sensor answered the hand shake or False otherwise.
+        """
+
+        self.__serial.init(baudrate = baudRate)
+
+        ## Let the sensor switch and discard what was received meanwhile
+        yield (_SLEEP, FINGERPRINT_NEGOTIATE_TIMEOUT // 4)
+
+        while ( self.__serial.any() ):
+            self.__serial.read()
+
+        try:
+            return (yield from self.__handshake(FINGERPRINT_NEGOTIATE_TIMEOUT))
+
+        except Exception:
+            return False
+
     def cancelInstruction(self):
         """Cancel last intruction to the sensor.
 
         Author:
             Chris Borrill <chris.borrill@gmail.com>
         """
+
+        return self._execute(self.__cancelInstruction())
+
+    def __cancelInstruction(self):
+        """Command of `cancelInstruction()`."""
+
         packetPayload = (
             FINGERPRINT_CANCEL_INSTRUCTION,
         )
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1568,7 +3476,7 @@ class PyFingerprint(object):
 
     def ledOn(self, colour=FINGERPRINT_LED_RED,
               control=FINGERPRINT_LED_BREATHING,
-              flashSpeed=0x7D, flashCount=0x00):
+              flashSpeed=0x7D, flashCount=0x00, wait=True):
         """
         Turn on sensor LED.
 
@@ -1584,23 +3492,29 @@ class PyFingerprint(object):
             FINGERPRINT_LED_GRADUAL_ON, FINGERPRINT_LED_GRADUAL_OFF
             flashSpeed: 0 (fast) to 255 (slow) (default 125)
             flashCount: 0 (infinite) to 255 (default 0)
+            wait: False to return without waiting for the sensor, its
+            response is then read by the next command, see getPostedError()
 
         Raises:
             Exception: if an error occured
         """
-        self.__led(control, colour, flashSpeed, flashCount)
+        return self._execute(self.__led(control, colour, flashSpeed, flashCount), not wait)
 
-    def ledOff(self):
+    def ledOff(self, wait=True):
         """
         Turn off sensor LED.
 
         Author:
             Chris Borrill <chris.borrill@gmail.com>
 
+        Arguments:
+            wait: False to return without waiting for the sensor, its
+            response is then read by the next command, see getPostedError()
+
         Raises:
             Exception: if an error occured
         """
-        self.__led(FINGERPRINT_LED_OFF, 0x00, 0x00, 0x00)
+        return self._execute(self.__led(FINGERPRINT_LED_OFF, 0x00, 0x00, 0x00), not wait)
 
     def __led(self, control, colour, flashSpeed, flashCount):
         packetPayload = (
@@ -1611,8 +3525,8 @@ class PyFingerprint(object):
             flashCount
         )
 
-        self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
-        receivedPacket = self.__readPacket()
+        yield from self.__writePacket(FINGERPRINT_COMMANDPACKET, packetPayload)
+        receivedPacket = yield from self.__readPacket()
 
         receivedPacketType = receivedPacket[0]
         receivedPacketPayload = receivedPacket[1]
@@ -1626,3 +3540,213 @@ class PyFingerprint(object):
             raise Exception('Communication error')
         else:
             raise Exception('Unknown error ' + hex(receivedPacketPayload[0]))
+
+
+## Queues of posted commands of the sensors sharing a lock: (lock, queue)
+_sharedPosted = []
+
+def _getSharedPosted(lock):
+    """
+    Gets the queue of posted commands of the sensors sharing a lock.
+
+    Arguments:
+        lock: The asyncio.Lock
+
+    Returns:
+        The queue (list).
+    """
+
+    for otherLock, posted in _sharedPosted:
+        if (otherLock is lock):
+            return posted
+
+    posted = []
+    _sharedPosted.append((lock, posted))
+
+    return posted
+
+
+class PyFingerprintAsync(PyFingerprint):
+    """
+    Manages ZhianTec fingerprint sensors without blocking the uasyncio event loop.
+
+    Offers the same methods as `PyFingerprint`, but every method that talks
+    to the sensor returns an awaitable, e.g. `await sensor.readImage()`.
+    Commands issued concurrently are serialized, except that other commands
+    run while a command waits between polls, e.g. for a finger in
+    `identify()`. Those should not touch the char buffers the waiting
+    command uses.
+
+    """
+
+    def __init__(self, uart, address=0xFFFFFFFF, password=0x00000000, timeout=FINGERPRINT_DEFAULT_TIMEOUT, lock=None):
+        """
+        Constructor.
+
+        Arguments:
+            uart: Instance of machine.UART. The baud rate set in the UART
+            instance MUST be a multiple of 9600.
+            address (int): The sensor address
+            password (int): The sensor password
+            timeout (int): Maximum time in milliseconds to wait for a complete
+            packet from the sensor, or None to wait forever
+            lock: Optional asyncio.Lock shared by all sensors on the same UART,
+            e.g. several addressed sensors on one RS-485 bus. Those sensors
+            also share the responses still to be read of posted commands.
+
+        Raises:
+            ValueError: if address or password are invalid
+        """
+        super().__init__(uart, address, password, timeout)
+
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+
+        self.__asyncio = asyncio
+        self.__reader = asyncio.StreamReader(uart)
+        self.__writer = asyncio.StreamWriter(uart, {})
+        if (lock is None):
+            lock = asyncio.Lock()
+        else:
+            self._sharePosted(_getSharedPosted(lock))
+
+        self.__lock = lock
+
+    async def __readInto(self, view, deadline):
+        """
+        Fills the given buffer completely with bytes received from the sensor.
+
+        Arguments:
+            view (memoryview): The buffer to fill
+            deadline (int): The deadline in `time.ticks_ms()` ticks, or None to wait forever
+
+        Raises:
+            FingerprintTimeoutError: if the deadline passes
+        """
+        if (deadline is None):
+            view[:] = await self.__reader.readexactly(len(view))
+            return
+
+        remaining = max(0, ticks_diff(deadline, ticks_ms()))
+
+        try:
+            view[:] = await self.__asyncio.wait_for(self.__reader.readexactly(len(view)), remaining / 1000)
+        except self.__asyncio.TimeoutError:
+            raise FingerprintTimeoutError('The sensor did not respond in time!')
+
+    async def _execute(self, command, post = False, timeout = None):
+        """
+        Runs a command, awaiting its I/O on the UART streams.
+
+        Arguments:
+            command (generator): The command
+            post (bool): Do not wait for the response of the command, see `PyFingerprint._run()`
+            timeout (int): Maximum time in milliseconds to wait for each packet of the command, or None to use the instance timeout
+
+        Returns:
+            The result of the command, or None if it is posted.
+        """
+        async with self.__lock:
+            requests = self._run(command, post, timeout)
+
+            try:
+                request = next(requests)
+
+                while (True):
+                    try:
+                        if (request[0] == _WRITE):
+                            self.__writer.write(request[1])
+                            await self.__writer.drain()
+                        elif (request[0] == _READ):
+                            await self.__readInto(request[1], request[2])
+                        elif (request[0] == _SLEEP):
+                            await self.__asyncio.sleep(request[1] / 1000)
+                        else:
+                            ## Let other commands, e.g. LED updates, use the sensor (and the bus) meanwhile
+                            self.__lock.release()
+
+                            try:
+                                await self.__asyncio.sleep(request[1] / 1000)
+                            finally:
+                                await self.__lock.acquire()
+
+                    except Exception as e:
+                        request = requests.throw(e)
+                        continue
+
+                    request = next(requests)
+
+            except StopIteration as e:
+                return e.value
+
+    def exportTemplates(self, buffer = None):
+        """
+        Downloads all stored templates, one at a time.
+
+        Use as `async for positionNumber, template in sensor.exportTemplates():`.
+
+        Arguments:
+            buffer (bytearray): Optional preallocated buffer reused for every template
+
+        Returns:
+            An asynchronous iterator of (positionNumber, template) tuples.
+        """
+        return _TemplateExportAsync(self, buffer)
+
+    async def importTemplates(self, templates, clear = False):
+        """
+        Stores templates, e.g. as produced by `exportTemplates()` of another sensor.
+
+        Arguments:
+            templates: An iterable or asynchronous iterable of (positionNumber, characteristicsData) tuples
+            clear (bool): Delete all stored templates first
+
+        Returns:
+            The list of positions (int) the templates were stored at.
+        """
+        if (clear):
+            await self.clearDatabase()
+
+        if (not hasattr(templates, '__aiter__')):
+            return await self.uploadTemplates(templates)
+
+        positions = []
+
+        ## Store every template before the next one is downloaded into a shared buffer
+        async for template in templates:
+            positions.extend(await self.uploadTemplates((template,)))
+
+        return positions
+
+
+class _TemplateExportAsync(object):
+    """
+    Asynchronous iterator over the templates stored in a sensor.
+
+    """
+
+    def __init__(self, sensor, buffer):
+        self.__sensor = sensor
+        self.__buffer = buffer
+        self.__positionNumber = 0
+        self.__templateIndex = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if (self.__templateIndex is None):
+            self.__templateIndex = await self.__sensor.getTemplateBitmap()
+
+        templateIndex = self.__templateIndex
+
+        while (self.__positionNumber < len(templateIndex) * 8):
+            positionNumber = self.__positionNumber
+            self.__positionNumber += 1
+
+            if ((templateIndex[positionNumber >> 3] >> (positionNumber & 7)) & 1):
+                return (positionNumber, await self.__sensor.exportTemplate(positionNumber, self.__buffer))
+
+        raise StopAsyncIteration
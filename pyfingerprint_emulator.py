@@ -0,0 +1,625 @@
+"""
+PyFingerprint sensor emulator
+
+Emulates a ZhianTec fingerprint sensor behind a UART, for development and
+load tests without hardware. Pass a `SensorEmulator` as the `uart` argument
+of `PyFingerprint`.
+
+"""
+
+try:
+    import ustruct
+except ImportError:
+    import struct as ustruct
+
+from pyfingerprint import FINGERPRINT_ACKPACKET, FINGERPRINT_CANCEL_INSTRUCTION, FINGERPRINT_CHARBUFFER1, \
+    FINGERPRINT_CHARBUFFER2, FINGERPRINT_CHECK_SENSOR, FINGERPRINT_CLEARDATABASE, FINGERPRINT_COMMANDPACKET, \
+    FINGERPRINT_COMPARECHARACTERISTICS, FINGERPRINT_CONVERTIMAGE, FINGERPRINT_CREATETEMPLATE, \
+    FINGERPRINT_DATAPACKET, FINGERPRINT_DELETETEMPLATE, FINGERPRINT_DOWNLOADCHARACTERISTICS, \
+    FINGERPRINT_DOWNLOADIMAGE, FINGERPRINT_ENDDATAPACKET, FINGERPRINT_ERROR_CHARACTERISTICSMISMATCH, \
+    FINGERPRINT_ERROR_COMMUNICATION, FINGERPRINT_ERROR_DELETETEMPLATE, \
+    FINGERPRINT_ERROR_DOWNLOADCHARACTERISTICS, FINGERPRINT_ERROR_INVALIDIMAGE, \
+    FINGERPRINT_ERROR_INVALIDPOSITION, FINGERPRINT_ERROR_INVALIDREGISTER, FINGERPRINT_ERROR_LOADTEMPLATE, \
+    FINGERPRINT_ERROR_MESSYIMAGE, FINGERPRINT_ERROR_NOFINGER, FINGERPRINT_ERROR_NOTEMPLATEFOUND, \
+    FINGERPRINT_ERROR_NOTMATCHING, FINGERPRINT_ERROR_WRONGPASSWORD, FINGERPRINT_GENERATERANDOMNUMBER, \
+    FINGERPRINT_GETSYSTEMPARAMETERS, FINGERPRINT_HANDSHAKE, FINGERPRINT_LED_CONFIG, FINGERPRINT_LOADTEMPLATE, \
+    FINGERPRINT_OK, FINGERPRINT_READIMAGE, FINGERPRINT_SEARCHTEMPLATE, FINGERPRINT_SETADDRESS, \
+    FINGERPRINT_SETPASSWORD, FINGERPRINT_SETSYSTEMPARAMETER, FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE, \
+    FINGERPRINT_SETSYSTEMPARAMETER_PACKAGE_SIZE, FINGERPRINT_SETSYSTEMPARAMETER_SECURITY_LEVEL, \
+    FINGERPRINT_SOFT_RESET, FINGERPRINT_STARTCODE, FINGERPRINT_STORETEMPLATE, FINGERPRINT_TEMPLATECOUNT, \
+    FINGERPRINT_TEMPLATEINDEX, FINGERPRINT_TEMPLATEINDEX_PAGEBYTES, FINGERPRINT_UPLOADCHARACTERISTICS, \
+    FINGERPRINT_VERIFYPASSWORD, ticks_us, ticks_diff
+
+
+EMULATOR_DELAYS = {
+    FINGERPRINT_READIMAGE: 100,
+    FINGERPRINT_CONVERTIMAGE: 150,
+    FINGERPRINT_CREATETEMPLATE: 50,
+    FINGERPRINT_STORETEMPLATE: 30,
+    FINGERPRINT_LOADTEMPLATE: 15,
+    FINGERPRINT_DELETETEMPLATE: 20,
+    FINGERPRINT_CLEARDATABASE: 100,
+    FINGERPRINT_SEARCHTEMPLATE: 5,
+    FINGERPRINT_COMPARECHARACTERISTICS: 5,
+    FINGERPRINT_SOFT_RESET: 200,
+}
+"""Default processing time in milliseconds per instruction code, 1 for the others."""
+
+EMULATOR_SEARCH_DELAY = 0.3
+"""Default additional processing time in milliseconds per position searched."""
+
+EMULATOR_IMAGESIZE = 256 * 288 // 2
+"""Size of the image buffer, 4 bits per pixel."""
+
+EMULATOR_TEMPLATESIZE = 512
+"""Size of the characteristics in a char buffer."""
+
+class SensorEmulator(object):
+    """
+    Fake `machine.UART` with an emulated fingerprint sensor behind it.
+
+    The emulator keeps a template library and answers every command of
+    `PyFingerprint`. Fingers are simulated by id: while a finger is placed
+    with `placeFinger()`, `readImage()` succeeds and `convertImage()` yields
+    characteristics unique to that finger. Two characteristics match if they
+    are equal, with an accuracy score of 100.
+
+    Every answer becomes readable after the processing time of the command
+    and the time its bytes take on the link, multiplied by the speed. With
+    a speed of 0 answers are immediate and `getModeledTime()` still tells
+    how long the session would take on a real link.
+
+    """
+
+    def __init__(self, capacity = 1000, baudrate = 57600, packetSize = 128, address = 0xFFFFFFFF, password = 0x00000000,
+                 speed = 1, delays = EMULATOR_DELAYS, searchDelay = EMULATOR_SEARCH_DELAY):
+        """
+        Constructor.
+
+        Arguments:
+            capacity (int): The template storage capacity
+            baudrate (int): The baud rate of the sensor and the link, a multiple of 9600
+            packetSize (int): The maximum packet size. 32, 64, 128 and 256 are supported.
+            address (int): The sensor address
+            password (int): The sensor password
+            speed (float): Factor for the modeled delays, 0 to answer immediately
+            delays (dict): The processing time in milliseconds per instruction code
+            searchDelay (float): The additional processing time in milliseconds per position searched
+
+        Raises:
+            ValueError: if the baud rate or packet size is invalid
+        """
+
+        if ( baudrate % 9600 != 0 or baudrate < 9600 or baudrate > 115200 ):
+            raise ValueError('The given baud rate is invalid!')
+
+        if ( packetSize not in (32, 64, 128, 256) ):
+            raise ValueError('The given packet size is invalid!')
+
+        self.__capacity = capacity
+        self.__baudrate = baudrate
+        self.__hostBaudrate = baudrate
+        self.__newBaudrate = None
+        self.__packetSize = packetSize
+        self.__address = address
+        self.__password = password
+        self.__securityLevel = 3
+
+        self.__speed = speed
+        self.__delays = delays
+        self.__searchDelay = searchDelay
+
+        self.__templates = [None] * capacity
+        self.__templateCount = 0
+        self.__charBuffers = [None, bytes(EMULATOR_TEMPLATESIZE), bytes(EMULATOR_TEMPLATESIZE)]
+        self.__imageFinger = None
+        self.__finger = None
+        self.__imageErrors = []
+        self.__random = 0x12345678
+        self.__led = None
+
+        self.__input = bytearray()
+        self.__output = bytearray()
+        self.__answer = bytearray()
+        self.__uploadBuffer = 0
+        self.__uploadData = None
+
+        ## Answers not yet readable: (ticks_us() when readable, data)
+        self.__pending = []
+        self.__modeledTime = 0
+        self.__commands = 0
+
+    ## UART
+    ##
+
+    def init(self, baudrate = None, **kwargs):
+        """Reconfigures the host side of the link, like `machine.UART.init()`."""
+
+        if ( baudrate is not None ):
+            self.__hostBaudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def __release(self):
+        """Makes the answers readable whose time has come."""
+
+        pending = self.__pending
+
+        while ( pending and ticks_diff(ticks_us(), pending[0][0]) >= 0 ):
+            self.__output += pending.pop(0)[1]
+
+    def any(self):
+        self.__release()
+        return len(self.__output)
+
+    def read(self, count = -1):
+        self.__release()
+
+        if ( not self.__output ):
+            return None
+
+        if ( count < 0 ):
+            count = len(self.__output)
+
+        data = bytes(self.__output[:count])
+        del self.__output[:count]
+        return data
+
+    def readinto(self, buffer, count = None):
+        self.__release()
+
+        if ( not self.__output ):
+            return None
+
+        count = min(len(buffer) if count is None else count, len(self.__output))
+        buffer[:count] = self.__output[:count]
+        del self.__output[:count]
+        return count
+
+    def write(self, data):
+        ## The sensor cannot decode bytes sent with another baud rate
+        if ( self.__hostBaudrate != self.__baudrate ):
+            return len(data)
+
+        self.__input += data
+        self.__modeledTime += len(data) * 10000000 // self.__baudrate
+
+        while ( len(self.__input) >= 9 ):
+            if ( self.__input[0] != 0xEF or self.__input[1] != 0x01 ):
+                ## Resynchronize on the next start code
+                del self.__input[0]
+                continue
+
+            length = (self.__input[7] << 8) | self.__input[8]
+
+            if ( len(self.__input) < 9 + length ):
+                break
+
+            frame = bytes(self.__input[:9 + length])
+            del self.__input[:9 + length]
+
+            self.__handleFrame(frame)
+
+        return len(data)
+
+    ## Simulation
+    ##
+
+    def placeFinger(self, fingerId = 0):
+        """
+        Places a finger on the sensor.
+
+        Arguments:
+            fingerId (int): The id of the finger, between 0 and 0xFFFFFFFF
+        """
+
+        self.__finger = fingerId
+
+    def removeFinger(self):
+        """Removes the finger from the sensor."""
+
+        self.__finger = None
+
+    def addImageErrors(self, *statuses):
+        """
+        Makes the next image conversions fail.
+
+        Arguments:
+            *statuses: The status codes, e.g. `FINGERPRINT_ERROR_MESSYIMAGE`, one per conversion
+        """
+
+        self.__imageErrors.extend(statuses)
+
+    def getCharacteristics(self, fingerId):
+        """
+        Gets the characteristics the emulator creates for a finger.
+
+        Arguments:
+            fingerId (int): The id of the finger
+
+        Returns:
+            The characteristics (bytes).
+        """
+
+        return ustruct.pack('>I', fingerId) * (EMULATOR_TEMPLATESIZE // 4)
+
+    def getTemplate(self, positionNumber):
+        """
+        Gets a stored template.
+
+        Arguments:
+            positionNumber (int): The position
+
+        Returns:
+            The template (bytes) or None if the position is free.
+        """
+
+        return self.__templates[positionNumber]
+
+    def setTemplate(self, positionNumber, characteristicsData):
+        """
+        Stores a template directly, e.g. to fill the library before a test.
+
+        Arguments:
+            positionNumber (int): The position
+            characteristicsData (bytes): The template, or None to free the position
+        """
+
+        if ( self.__templates[positionNumber] is not None ):
+            self.__templateCount -= 1
+
+        if ( characteristicsData is not None ):
+            self.__templateCount += 1
+            characteristicsData = bytes(characteristicsData)
+
+        self.__templates[positionNumber] = characteristicsData
+
+    def getLed(self):
+        """
+        Gets the last LED configuration.
+
+        Returns:
+            The tuple (control, flashSpeed, colour, flashCount) or None.
+        """
+
+        return self.__led
+
+    def getModeledTime(self):
+        """
+        Gets the modeled time of all commands so far, processing and link, regardless of the speed.
+
+        Returns:
+            The time in microseconds (int).
+        """
+
+        return self.__modeledTime
+
+    def getCommandCount(self):
+        """
+        Gets the number of commands processed.
+
+        Returns:
+            The number of commands (int).
+        """
+
+        return self.__commands
+
+    def resetCounters(self):
+        """Resets the modeled time and the command count."""
+
+        self.__modeledTime = 0
+        self.__commands = 0
+
+    ## Protocol
+    ##
+
+    def __send(self, packetType, packetPayload):
+        """Appends a packet to the answer being built."""
+
+        length = len(packetPayload) + 2
+        checksum = packetType + (length >> 8) + (length & 0xFF) + sum(packetPayload)
+
+        self.__answer += ustruct.pack('>HIBH', FINGERPRINT_STARTCODE, self.__address, packetType, length)
+        self.__answer += packetPayload
+        self.__answer += ustruct.pack('>H', checksum & 0xFFFF)
+
+    def __ack(self, status, *data):
+        self.__send(FINGERPRINT_ACKPACKET, bytes((status,) + data))
+
+    def __sendData(self, data):
+        packetSize = self.__packetSize
+
+        for i in range(0, len(data), packetSize):
+            packetType = FINGERPRINT_ENDDATAPACKET if i + packetSize >= len(data) else FINGERPRINT_DATAPACKET
+            self.__send(packetType, data[i:i + packetSize])
+
+    def __handleFrame(self, frame):
+        """Processes a frame and queues the answer."""
+
+        packetType = frame[6]
+        packetPayload = frame[9:-2]
+
+        length = len(frame) - 9
+        checksum = packetType + (length >> 8) + (length & 0xFF) + sum(packetPayload)
+
+        if ( ustruct.unpack('>I', frame[2:6])[0] != self.__address ):
+            return
+
+        if ( (frame[-2] << 8 | frame[-1]) != checksum & 0xFFFF ):
+            if ( packetType == FINGERPRINT_COMMANDPACKET ):
+                self.__ack(FINGERPRINT_ERROR_COMMUNICATION)
+                self.__queueAnswer(1)
+            return
+
+        ## Data packets of an upload
+        if ( packetType == FINGERPRINT_DATAPACKET or packetType == FINGERPRINT_ENDDATAPACKET ):
+            if ( self.__uploadData is not None ):
+                self.__uploadData += packetPayload
+
+                if ( packetType == FINGERPRINT_ENDDATAPACKET ):
+                    self.__charBuffers[self.__uploadBuffer] = bytes(self.__uploadData)
+                    self.__uploadData = None
+            return
+
+        if ( packetType != FINGERPRINT_COMMANDPACKET or not packetPayload ):
+            return
+
+        instruction = packetPayload[0]
+        delay = self.__delays.get(instruction, 1)
+
+        self.__commands += 1
+        delay += self.__handleCommand(instruction, packetPayload)
+
+        self.__queueAnswer(delay)
+
+        ## A new baud rate applies after the ack
+        if ( self.__newBaudrate is not None ):
+            self.__baudrate = self.__newBaudrate
+            self.__newBaudrate = None
+
+    def __queueAnswer(self, delay):
+        """
+        Queues the answer built so far.
+
+        Arguments:
+            delay (float): The processing time in milliseconds
+        """
+
+        answer = bytes(self.__answer)
+        self.__answer = bytearray()
+
+        modeled = int(delay * 1000) + len(answer) * 10000000 // self.__baudrate
+        self.__modeledTime += modeled
+
+        self.__pending.append((ticks_us() + int(modeled * self.__speed), answer))
+
+    def __handleCommand(self, instruction, packetPayload):
+        """
+        Processes a command and builds its answer.
+
+        Returns:
+            The additional processing time in milliseconds.
+        """
+
+        if ( instruction == FINGERPRINT_VERIFYPASSWORD ):
+            password = ustruct.unpack('>I', packetPayload[1:5])[0]
+            self.__ack(FINGERPRINT_OK if password == self.__password else FINGERPRINT_ERROR_WRONGPASSWORD)
+
+        elif ( instruction == FINGERPRINT_SETPASSWORD ):
+            self.__password = ustruct.unpack('>I', packetPayload[1:5])[0]
+            self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_SETADDRESS ):
+            self.__address = ustruct.unpack('>I', packetPayload[1:5])[0]
+            self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_GETSYSTEMPARAMETERS ):
+            self.__ack(FINGERPRINT_OK, *ustruct.pack('>HHHHIHH', 0x0000, 0x0009, self.__capacity, self.__securityLevel,
+                                                       self.__address, (32, 64, 128, 256).index(self.__packetSize), self.__baudrate // 9600))
+
+        elif ( instruction == FINGERPRINT_SETSYSTEMPARAMETER ):
+            self.__setSystemParameter(packetPayload[1], packetPayload[2])
+
+        elif ( instruction == FINGERPRINT_TEMPLATEINDEX ):
+            self.__ack(FINGERPRINT_OK, *self.__templateIndex(packetPayload[1]))
+
+        elif ( instruction == FINGERPRINT_TEMPLATECOUNT ):
+            self.__ack(FINGERPRINT_OK, self.__templateCount >> 8, self.__templateCount & 0xFF)
+
+        elif ( instruction == FINGERPRINT_READIMAGE ):
+            self.__imageFinger = self.__finger
+            self.__ack(FINGERPRINT_OK if self.__finger is not None else FINGERPRINT_ERROR_NOFINGER)
+
+        elif ( instruction == FINGERPRINT_CONVERTIMAGE ):
+            self.__convertImage(packetPayload[1])
+
+        elif ( instruction == FINGERPRINT_CREATETEMPLATE ):
+            if ( self.__charBuffers[1] == self.__charBuffers[2] ):
+                self.__ack(FINGERPRINT_OK)
+            else:
+                self.__ack(FINGERPRINT_ERROR_CHARACTERISTICSMISMATCH)
+
+        elif ( instruction == FINGERPRINT_STORETEMPLATE ):
+            positionNumber = ustruct.unpack('>H', packetPayload[2:4])[0]
+
+            if ( positionNumber >= self.__capacity or not self.__isCharBuffer(packetPayload[1]) ):
+                self.__ack(FINGERPRINT_ERROR_INVALIDPOSITION)
+            else:
+                self.setTemplate(positionNumber, self.__charBuffers[packetPayload[1]])
+                self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_LOADTEMPLATE ):
+            positionNumber = ustruct.unpack('>H', packetPayload[2:4])[0]
+
+            if ( positionNumber >= self.__capacity or not self.__isCharBuffer(packetPayload[1]) ):
+                self.__ack(FINGERPRINT_ERROR_INVALIDPOSITION)
+            elif ( self.__templates[positionNumber] is None ):
+                self.__ack(FINGERPRINT_ERROR_LOADTEMPLATE)
+            else:
+                self.__charBuffers[packetPayload[1]] = self.__templates[positionNumber]
+                self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_DELETETEMPLATE ):
+            positionNumber, count = ustruct.unpack('>HH', packetPayload[1:5])
+
+            if ( positionNumber + count > self.__capacity ):
+                self.__ack(FINGERPRINT_ERROR_DELETETEMPLATE)
+            else:
+                for i in range(positionNumber, positionNumber + count):
+                    self.setTemplate(i, None)
+
+                self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_CLEARDATABASE ):
+            self.__templates = [None] * self.__capacity
+            self.__templateCount = 0
+            self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_SEARCHTEMPLATE ):
+            return self.__searchTemplate(packetPayload)
+
+        elif ( instruction == FINGERPRINT_COMPARECHARACTERISTICS ):
+            if ( self.__charBuffers[1] == self.__charBuffers[2] ):
+                self.__ack(FINGERPRINT_OK, 0, 100)
+            else:
+                self.__ack(FINGERPRINT_ERROR_NOTMATCHING, 0, 0)
+
+        elif ( instruction == FINGERPRINT_UPLOADCHARACTERISTICS ):
+            if ( not self.__isCharBuffer(packetPayload[1]) ):
+                self.__ack(FINGERPRINT_ERROR_COMMUNICATION)
+            else:
+                self.__uploadBuffer = packetPayload[1]
+                self.__uploadData = bytearray()
+                self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_DOWNLOADCHARACTERISTICS ):
+            if ( not self.__isCharBuffer(packetPayload[1]) ):
+                self.__ack(FINGERPRINT_ERROR_DOWNLOADCHARACTERISTICS)
+            else:
+                self.__ack(FINGERPRINT_OK)
+                self.__sendData(self.__charBuffers[packetPayload[1]])
+
+        elif ( instruction == FINGERPRINT_DOWNLOADIMAGE ):
+            self.__ack(FINGERPRINT_OK)
+            self.__sendData(self.__image())
+
+        elif ( instruction == FINGERPRINT_GENERATERANDOMNUMBER ):
+            self.__random = (self.__random * 1103515245 + 12345) & 0xFFFFFFFF
+            self.__ack(FINGERPRINT_OK, *ustruct.pack('>I', self.__random))
+
+        elif ( instruction == FINGERPRINT_LED_CONFIG ):
+            self.__led = tuple(packetPayload[1:5])
+            self.__ack(FINGERPRINT_OK)
+
+        elif ( instruction == FINGERPRINT_SOFT_RESET ):
+            self.__charBuffers = [None, bytes(EMULATOR_TEMPLATESIZE), bytes(EMULATOR_TEMPLATESIZE)]
+            self.__led = None
+            self.__ack(FINGERPRINT_OK)
+
+            ## The sensor sends 0x55 when it is ready again
+            self.__answer.append(0x55)
+
+        elif ( instruction in (FINGERPRINT_HANDSHAKE, FINGERPRINT_CHECK_SENSOR, FINGERPRINT_CANCEL_INSTRUCTION) ):
+            self.__ack(FINGERPRINT_OK)
+
+        else:
+            self.__ack(FINGERPRINT_ERROR_COMMUNICATION)
+
+        return 0
+
+    def __isCharBuffer(self, charBufferNumber):
+        return charBufferNumber == FINGERPRINT_CHARBUFFER1 or charBufferNumber == FINGERPRINT_CHARBUFFER2
+
+    def __setSystemParameter(self, parameterNumber, parameterValue):
+        """Sets a system parameter and acknowledges it."""
+
+        if ( parameterNumber == FINGERPRINT_SETSYSTEMPARAMETER_BAUDRATE and 1 <= parameterValue <= 12 ):
+            self.__newBaudrate = parameterValue * 9600
+            self.__ack(FINGERPRINT_OK)
+
+        elif ( parameterNumber == FINGERPRINT_SETSYSTEMPARAMETER_SECURITY_LEVEL and 1 <= parameterValue <= 5 ):
+            self.__securityLevel = parameterValue
+            self.__ack(FINGERPRINT_OK)
+
+        elif ( parameterNumber == FINGERPRINT_SETSYSTEMPARAMETER_PACKAGE_SIZE and 0 <= parameterValue <= 3 ):
+            self.__packetSize = 32 << parameterValue
+            self.__ack(FINGERPRINT_OK)
+
+        else:
+            self.__ack(FINGERPRINT_ERROR_INVALIDREGISTER)
+
+    def __templateIndex(self, page):
+        """
+        Builds a page of the template index.
+
+        Returns:
+            The page (bytearray), one bit per position.
+        """
+
+        index = bytearray(FINGERPRINT_TEMPLATEINDEX_PAGEBYTES)
+        positionStart = page * FINGERPRINT_TEMPLATEINDEX_PAGEBYTES * 8
+        templates = self.__templates
+
+        for i in range(FINGERPRINT_TEMPLATEINDEX_PAGEBYTES * 8):
+            position = positionStart + i
+
+            if ( position < self.__capacity and templates[position] is not None ):
+                index[i >> 3] |= 1 << (i & 7)
+
+        return index
+
+    def __convertImage(self, charBufferNumber):
+        """Converts the image into a char buffer and acknowledges it."""
+
+        if ( not self.__isCharBuffer(charBufferNumber) ):
+            self.__ack(FINGERPRINT_ERROR_COMMUNICATION)
+
+        elif ( self.__imageErrors ):
+            self.__ack(self.__imageErrors.pop(0))
+
+        elif ( self.__imageFinger is None ):
+            self.__ack(FINGERPRINT_ERROR_INVALIDIMAGE)
+
+        else:
+            self.__charBuffers[charBufferNumber] = self.getCharacteristics(self.__imageFinger)
+            self.__ack(FINGERPRINT_OK)
+
+    def __searchTemplate(self, packetPayload):
+        """
+        Searches a char buffer in a range of positions and acknowledges it.
+
+        Returns:
+            The processing time in milliseconds of the positions searched.
+        """
+
+        charBufferNumber = packetPayload[1]
+        positionStart, count = ustruct.unpack('>HH', packetPayload[2:6])
+        positionEnd = min(positionStart + count, self.__capacity)
+
+        if ( not self.__isCharBuffer(charBufferNumber) ):
+            self.__ack(FINGERPRINT_ERROR_COMMUNICATION)
+            return 0
+
+        characteristics = self.__charBuffers[charBufferNumber]
+        templates = self.__templates
+
+        for position in range(positionStart, positionEnd):
+            if ( templates[position] == characteristics ):
+                self.__ack(FINGERPRINT_OK, position >> 8, position & 0xFF, 0, 100)
+                return (position - positionStart + 1) * self.__searchDelay
+
+        self.__ack(FINGERPRINT_ERROR_NOTEMPLATEFOUND, 0, 0, 0, 0)
+        return max(0, positionEnd - positionStart) * self.__searchDelay
+
+    def __image(self):
+        """
+        Builds the image of the finger in the image buffer.
+
+        Returns:
+            The image (bytes).
+        """
+
+        seed = 0 if self.__imageFinger is None else self.__imageFinger & 0xFF
+
+        return bytes((seed + i) & 0xFF for i in range(256)) * (EMULATOR_IMAGESIZE // 256)
@@ -0,0 +1,274 @@
+"""
+PyFingerprint sensor manager
+
+Drives several fingerprint sensors from one controller, on separate UARTs
+or as addressed modules sharing one bus.
+
+"""
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from pyfingerprint import PyFingerprintAsync, FINGERPRINT_CHARBUFFER1, FINGERPRINT_DEFAULT_TIMEOUT, \
+    FINGERPRINT_POLL_MIN_INTERVAL, FINGERPRINT_POLL_MAX_INTERVAL, FingerprintTimeoutError, ticks_ms, ticks_add, ticks_diff
+
+
+class SensorManager(object):
+    """
+    Manages several ZhianTec fingerprint sensors with `PyFingerprintAsync`.
+
+    Sensors on different UARTs run their commands at the same time. Sensors
+    sharing a UART, e.g. addressed modules on an RS-485 bus, share a lock so
+    their commands run one after another, in the order they were issued.
+
+    """
+
+    def __init__(self):
+        """Constructor."""
+
+        self.__names = []
+        self.__sensors = {}
+        self.__locks = []
+        self.__next = 0
+        self.__characteristics = bytearray(512)
+
+    def addSensor(self, name, uart, address = 0xFFFFFFFF, password = 0x00000000, timeout = FINGERPRINT_DEFAULT_TIMEOUT):
+        """
+        Adds a sensor.
+
+        Arguments:
+            name (str): The name of the sensor
+            uart: Instance of machine.UART the sensor is connected to
+            address (int): The sensor address, must be unique among the sensors on the same UART
+            password (int): The sensor password
+            timeout (int): Maximum time in milliseconds to wait for a complete packet from the sensor, or None to wait forever
+
+        Returns:
+            The sensor (`PyFingerprintAsync`).
+
+        Raises:
+            ValueError: if the name is already used, or address or password are invalid
+        """
+
+        if ( name in self.__sensors ):
+            raise ValueError('The given sensor name is already used!')
+
+        lock = None
+
+        ## Sensors on the same UART share one lock
+        for otherUart, otherLock in self.__locks:
+            if ( otherUart is uart ):
+                lock = otherLock
+                break
+
+        if ( lock is None ):
+            lock = asyncio.Lock()
+            self.__locks.append((uart, lock))
+
+        sensor = PyFingerprintAsync(uart, address, password, timeout, lock)
+
+        self.__names.append(name)
+        self.__sensors[name] = sensor
+
+        return sensor
+
+    def getSensor(self, name):
+        """
+        Gets a sensor.
+
+        Arguments:
+            name (str): The name of the sensor
+
+        Returns:
+            The sensor (`PyFingerprintAsync`).
+
+        Raises:
+            ValueError: if no sensor has the name
+        """
+
+        try:
+            return self.__sensors[name]
+
+        except KeyError:
+            raise ValueError('The given sensor name is unknown!')
+
+    def getNames(self):
+        """
+        Gets the names of all sensors, in the order they were added.
+
+        Returns:
+            The list of names.
+        """
+
+        return list(self.__names)
+
+    def __roundRobin(self):
+        """
+        Gets the names of all sensors, starting one further each call.
+
+        Returns:
+            The list of names.
+        """
+
+        names = self.__names
+        start = self.__next % len(names)
+        self.__next = start + 1
+
+        return names[start:] + names[:start]
+
+    async def run(self, method, *args):
+        """
+        Runs a method on all sensors, e.g. `await manager.run('ledOn')`.
+
+        The sensors are started round-robin, so on a shared bus every sensor
+        gets to run first in turn.
+
+        Arguments:
+            method (str): The name of the `PyFingerprintAsync` method
+            *args: The arguments of the method
+
+        Returns:
+            A dictionary with the result of every sensor by name.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        names = self.__roundRobin()
+        results = await asyncio.gather(*[getattr(self.__sensors[name], method)(*args) for name in names])
+
+        return dict(zip(names, results))
+
+    async def waitForFinger(self, timeout = None, minInterval = FINGERPRINT_POLL_MIN_INTERVAL, maxInterval = FINGERPRINT_POLL_MAX_INTERVAL):
+        """
+        Reads images on all sensors round-robin until one of them has a finger.
+        The image stays in the image buffer of that sensor.
+
+        While no finger is present the rounds are repeated less and less
+        often, from every `minInterval` up to every `maxInterval` milliseconds.
+
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for a finger, or None to wait forever
+            minInterval (int): The shortest time in milliseconds between two rounds
+            maxInterval (int): The longest time in milliseconds between two rounds
+
+        Returns:
+            The name (str) of the sensor with the finger.
+
+        Raises:
+            FingerprintTimeoutError: if no finger is placed in time
+            Exception: if any error occurs
+        """
+
+        deadline = None if timeout is None else ticks_add(ticks_ms(), timeout)
+        interval = minInterval
+
+        while ( True ):
+            results = await self.run('readImage')
+
+            for name in results:
+                if ( results[name] ):
+                    return name
+
+            if ( deadline is not None and ticks_diff(deadline, ticks_ms()) <= 0 ):
+                raise FingerprintTimeoutError('No finger was placed on a sensor in time')
+
+            await asyncio.sleep(interval / 1000)
+            interval = min(interval * 2, maxInterval)
+
+    async def search(self, characteristicsData, partition = None, exclude = None):
+        """
+        Searches for the characteristics on all sensors at once, for sensors
+        that hold different parts of the template database.
+
+        The characteristics are uploaded to char buffer 1 of every sensor.
+
+        Arguments:
+            characteristicsData (bytes): The characteristics
+            partition (str): Optional partition to search on every sensor, see `PyFingerprint.definePartition()`
+            exclude (str): Optional name of a sensor not to search
+
+        Returns:
+            A tuple that contain the following information:
+            0: string The name of the sensor with the best match, or None if no sensor found the characteristics.
+            1: integer(2 bytes) The position number of found template.
+            2: integer(2 bytes) The accuracy score of found template.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        names = [name for name in self.__roundRobin() if name != exclude]
+        results = await asyncio.gather(*[self.__search(self.__sensors[name], characteristicsData, partition) for name in names])
+
+        return self.__best(names, results)
+
+    async def __search(self, sensor, characteristicsData, partition):
+        """
+        Uploads the characteristics to a sensor and searches for them.
+
+        Returns:
+            The result of `searchTemplate()`.
+        """
+
+        await sensor.uploadCharacteristics(FINGERPRINT_CHARBUFFER1, characteristicsData, verify = False)
+        return await sensor.searchTemplate(FINGERPRINT_CHARBUFFER1, partition = partition)
+
+    def __best(self, names, results):
+        """
+        Picks the search result with the highest accuracy score.
+
+        Returns:
+            The tuple described in `search()`.
+        """
+
+        best = (None, -1, -1)
+
+        for name, result in zip(names, results):
+            if ( result[0] >= 0 and result[1] > best[2] ):
+                best = (name, result[0], result[1])
+
+        return best
+
+    async def identify(self, timeout = None, partition = None):
+        """
+        Waits for a finger on any sensor and searches for it on all sensors.
+
+        The sensor with the finger searches its own database while its
+        characteristics are uploaded to and searched on the other sensors.
+
+        Arguments:
+            timeout (int): Maximum time in milliseconds to wait for a finger, or None to wait forever
+            partition (str): Optional partition to search on every sensor, see `PyFingerprint.definePartition()`
+
+        Returns:
+            A tuple that contain the following information:
+            0: string The name of the sensor with the finger.
+            1: string The name of the sensor with the best match, or None if no sensor found the finger.
+            2: integer(2 bytes) The position number of found template.
+            3: integer(2 bytes) The accuracy score of found template.
+
+        Raises:
+            FingerprintTimeoutError: if no finger is placed in time
+            Exception: if any error occurs
+        """
+
+        name = await self.waitForFinger(timeout)
+        sensor = self.__sensors[name]
+
+        await sensor.convertImage(FINGERPRINT_CHARBUFFER1)
+
+        if ( len(self.__names) == 1 ):
+            own = await sensor.searchTemplate(FINGERPRINT_CHARBUFFER1, partition = partition)
+            return (name,) + self.__best([name], [own])
+
+        count = await sensor.downloadCharacteristics(FINGERPRINT_CHARBUFFER1, self.__characteristics)
+
+        own, other = await asyncio.gather(
+            sensor.searchTemplate(FINGERPRINT_CHARBUFFER1, partition = partition),
+            self.search(memoryview(self.__characteristics)[:count], partition, exclude = name),
+        )
+
+        return (name,) + self.__best([name, other[0]], [own, other[1:]])
@@ -0,0 +1,241 @@
+"""
+PyFingerprint command statistics
+
+Records the latency, the bytes transferred and the errors of every command
+sent to a sensor, see `PyFingerprint.setInstrumentation()`.
+
+"""
+
+from array import array
+
+from pyfingerprint import ticks_us, ticks_diff
+
+
+STATISTICS_SIZE = 32
+"""Default number of latencies kept per command."""
+
+class _CommandRecord(object):
+    """
+    Statistics of one instruction code.
+
+    """
+
+    def __init__(self, size):
+        self.count = 0
+        self.total = 0
+        self.minimum = 0
+        self.maximum = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.checksumFailures = 0
+        self.timeouts = 0
+
+        ## Ring buffer of the latest latencies
+        self.latencies = array('I', bytes(4 * size))
+        self.next = 0
+
+class CommandStatistics(object):
+    """
+    Records per instruction code (e.g. `FINGERPRINT_SEARCHTEMPLATE`) the
+    number of commands, their latency, the bytes sent and received, checksum
+    failures and timeouts.
+
+    The latency of a command is the time from sending it until its ack
+    packet is received, in microseconds. Minimum, average and maximum cover
+    all commands, the percentiles the latest ones kept in a ring buffer.
+    The latency of a posted command (e.g. `ledOn(wait=False)`) is not
+    recorded, its ack is only read when the host sends the next command.
+
+    """
+
+    def __init__(self, size = STATISTICS_SIZE):
+        """
+        Constructor.
+
+        Arguments:
+            size (int): The number of latencies kept per instruction code
+
+        Raises:
+            ValueError: if passed size is invalid
+        """
+
+        if ( size < 1 ):
+            raise ValueError('The given size is invalid!')
+
+        self.__size = size
+        self.__records = {}
+        self.__current = None
+        self.__sentAt = None
+
+    def commandSent(self, instruction, byteCount):
+        """
+        Called by the sensor when a command packet is sent.
+
+        Arguments:
+            instruction (int): The instruction code
+            byteCount (int): The size of the packet
+        """
+
+        record = self.__records.get(instruction)
+
+        if ( record is None ):
+            record = _CommandRecord(self.__size)
+            self.__records[instruction] = record
+
+        record.bytesSent += byteCount
+
+        self.__current = record
+        self.__sentAt = ticks_us()
+
+    def commandPosted(self):
+        """
+        Called by the sensor when the last command is posted, its ack is read
+        later so the latency is not measured.
+        """
+
+        self.__sentAt = None
+
+    def packetSent(self, byteCount):
+        """
+        Called by the sensor when a data packet is sent.
+
+        Arguments:
+            byteCount (int): The size of the packet
+        """
+
+        if ( self.__current is not None ):
+            self.__current.bytesSent += byteCount
+
+    def packetReceived(self, byteCount):
+        """
+        Called by the sensor when a packet is received. The first packet
+        after a command is its ack and completes the latency measurement.
+
+        Arguments:
+            byteCount (int): The size of the packet
+        """
+
+        record = self.__current
+
+        if ( record is None ):
+            return
+
+        record.bytesReceived += byteCount
+
+        if ( self.__sentAt is None ):
+            return
+
+        latency = ticks_diff(ticks_us(), self.__sentAt)
+        self.__sentAt = None
+
+        if ( record.count == 0 or latency < record.minimum ):
+            record.minimum = latency
+
+        if ( latency > record.maximum ):
+            record.maximum = latency
+
+        record.count += 1
+        record.total += latency
+
+        record.latencies[record.next] = latency
+        record.next = (record.next + 1) % self.__size
+
+    def checksumFailed(self):
+        """Called by the sensor when a packet with a wrong checksum is received."""
+
+        if ( self.__current is not None ):
+            self.__current.checksumFailures += 1
+
+    def timedOut(self):
+        """Called by the sensor when a packet is not received in time."""
+
+        if ( self.__current is not None ):
+            self.__current.timeouts += 1
+
+    def reset(self):
+        """Discards all statistics."""
+
+        self.__records = {}
+        self.__current = None
+        self.__sentAt = None
+
+    def getInstructions(self):
+        """
+        Gets the instruction codes of all recorded commands.
+
+        Returns:
+            The list of instruction codes.
+        """
+
+        return sorted(self.__records)
+
+    def getPercentile(self, instruction, percent):
+        """
+        Gets a percentile of the latest latencies of an instruction.
+
+        Arguments:
+            instruction (int): The instruction code
+            percent (int): The percentile, between 0 and 100
+
+        Returns:
+            The latency in microseconds (int), or -1 if no command was recorded.
+
+        Raises:
+            ValueError: if passed percentile is invalid
+        """
+
+        if ( percent < 0 or percent > 100 ):
+            raise ValueError('The given percentile is invalid!')
+
+        record = self.__records.get(instruction)
+
+        if ( record is None or record.count == 0 ):
+            return -1
+
+        latencies = sorted(record.latencies[:min(record.count, self.__size)])
+
+        return latencies[(len(latencies) - 1) * percent // 100]
+
+    def getStatistics(self, instruction):
+        """
+        Gets the statistics of an instruction.
+
+        Arguments:
+            instruction (int): The instruction code
+
+        Returns:
+            A dictionary with the keys 'count', 'min', 'avg', 'max', 'p50',
+            'p90', 'p99' (latencies in microseconds, -1 if unknown),
+            'bytesSent', 'bytesReceived', 'checksumFailures' and 'timeouts'.
+        """
+
+        record = self.__records.get(instruction)
+
+        if ( record is None ):
+            record = _CommandRecord(0)
+
+        known = record.count > 0
+
+        return {
+            'count': record.count,
+            'min': record.minimum if known else -1,
+            'avg': record.total // record.count if known else -1,
+            'max': record.maximum if known else -1,
+            'p50': self.getPercentile(instruction, 50),
+            'p90': self.getPercentile(instruction, 90),
+            'p99': self.getPercentile(instruction, 99),
+            'bytesSent': record.bytesSent,
+            'bytesReceived': record.bytesReceived,
+            'checksumFailures': record.checksumFailures,
+            'timeouts': record.timeouts,
+        }
+
+    def export(self):
+        """
+        Gets the statistics of all instructions, e.g. to send them as JSON.
+
+        Returns:
+            A dictionary with the statistics described in `getStatistics()` by instruction code (as hex string, e.g. '0x4').
+        """
+
+        return dict((hex(instruction), self.getStatistics(instruction)) for instruction in self.getInstructions())
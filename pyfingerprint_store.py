@@ -0,0 +1,840 @@
+"""
+PyFingerprint template store
+
+Host-side storage of fingerprint templates, for user populations larger
+than the sensor's own template database.
+
+"""
+
+from array import array
+
+try:
+    import ustruct
+except ImportError:
+    import struct as ustruct
+
+from pyfingerprint import PyFingerprintAsync, FINGERPRINT_CHARBUFFER1, FINGERPRINT_CHARBUFFER2, ticks_ms, ticks_diff
+
+
+## File layout
+##
+## Header:  magic (4 bytes), version (1 byte), reserved (1 byte),
+##          system id (2 bytes), template size (2 bytes), capacity (4 bytes)
+## Index:   capacity x user id (4 bytes, little endian), 0xFFFFFFFF if unused
+## Records: capacity x template (template size bytes), record i belongs to index entry i
+
+TEMPLATESTORE_MAGIC = b'PFTS'
+TEMPLATESTORE_VERSION = 1
+TEMPLATESTORE_HEADER = '<4sBBHHI'
+TEMPLATESTORE_HEADERSIZE = 14
+
+TEMPLATESTORE_UNUSED = 0xFFFFFFFF
+"""Index entry of an unused record."""
+
+TEMPLATESTORE_TEMPLATESIZE = 512
+"""Default template size, matches the characteristics of ZFM sensors."""
+
+def _checkSync(sensor, alternative = None):
+    """
+    Rejects sensors whose commands must be awaited.
+
+    Arguments:
+        sensor (PyFingerprint): The sensor
+        alternative (str): Optional method to use instead
+
+    Raises:
+        ValueError: if the sensor is a `PyFingerprintAsync`
+    """
+
+    if ( isinstance(sensor, PyFingerprintAsync) ):
+        if ( alternative is None ):
+            raise ValueError('The given sensor is asynchronous!')
+        else:
+            raise ValueError('The given sensor is asynchronous, use ' + alternative + '()!')
+
+class TemplateStore(object):
+    """
+    Stores fingerprint templates by user id in a binary file.
+
+    Templates are kept in fixed-size records and located through an index of
+    user ids read into memory when the store is opened (4 bytes per record),
+    plus a dictionary from user id to record for constant time lookups.
+    Templates are read and written with seeks, so only one template is held
+    in memory at a time.
+
+    """
+
+    def __init__(self, path):
+        """
+        Opens an existing store. Use `TemplateStore.create()` to create one.
+
+        Arguments:
+            path (str): The file path
+
+        Raises:
+            ValueError: if the file is not a template store
+        """
+
+        self.__file = open(path, 'r+b')
+
+        header = self.__file.read(TEMPLATESTORE_HEADERSIZE)
+
+        if ( len(header) != TEMPLATESTORE_HEADERSIZE ):
+            raise ValueError('The given file is no template store!')
+
+        magic, version, _, systemID, templateSize, capacity = ustruct.unpack(TEMPLATESTORE_HEADER, header)
+
+        if ( magic != TEMPLATESTORE_MAGIC or version != TEMPLATESTORE_VERSION ):
+            raise ValueError('The given file is no template store!')
+
+        self.__systemID = systemID
+        self.__templateSize = templateSize
+        self.__capacity = capacity
+        self.__recordsOffset = TEMPLATESTORE_HEADERSIZE + 4 * capacity
+
+        ## Read the whole index at once
+        self.__userIds = array('I', (0 for _ in range(capacity)))
+        self.__file.readinto(self.__userIds)
+
+        ## Record of every user, and the lowest record that may be unused
+        self.__records = {}
+        self.__freeHint = 0
+
+        for record in range(0, capacity):
+            userId = self.__userIds[record]
+
+            if ( userId != TEMPLATESTORE_UNUSED ):
+                self.__records[userId] = record
+
+        self.__count = len(self.__records)
+
+        ## Buffer reused for every template read
+        self.__buffer = bytearray(templateSize)
+
+    @staticmethod
+    def create(path, systemID, capacity, templateSize = TEMPLATESTORE_TEMPLATESIZE):
+        """
+        Creates an empty store, replacing any existing file.
+
+        Arguments:
+            path (str): The file path
+            systemID (int): The system id of the sensor the templates come
+            from, see `PyFingerprint.getSystemParameters()`
+            capacity (int): The maximum number of templates
+            templateSize (int): The size of one template in bytes
+
+        Returns:
+            The opened store (`TemplateStore`).
+        """
+
+        with open(path, 'wb') as f:
+            f.write(ustruct.pack(TEMPLATESTORE_HEADER, TEMPLATESTORE_MAGIC, TEMPLATESTORE_VERSION, 0, systemID, templateSize, capacity))
+
+            unused = ustruct.pack('<I', TEMPLATESTORE_UNUSED)
+
+            for _ in range(0, capacity):
+                f.write(unused)
+
+        return TemplateStore(path)
+
+    def close(self):
+        """Closes the file."""
+
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.__count
+
+    def __contains__(self, userId):
+        return self.__find(userId) >= 0
+
+    def __find(self, userId):
+        """
+        Finds the record of a user.
+
+        Arguments:
+            userId (int): The user id
+
+        Returns:
+            The record number (int) or -1 if the user has no template.
+        """
+
+        return self.__records.get(userId, -1)
+
+    def __findUnused(self):
+        """
+        Finds the first unused record.
+
+        Returns:
+            The record number (int) or -1 if the store is full.
+        """
+
+        userIds = self.__userIds
+
+        for i in range(self.__freeHint, self.__capacity):
+            if ( userIds[i] == TEMPLATESTORE_UNUSED ):
+                self.__freeHint = i
+                return i
+
+        self.__freeHint = self.__capacity
+
+        return -1
+
+    def __writeUserId(self, record, userId):
+        """
+        Writes an index entry.
+
+        Arguments:
+            record (int): The record number
+            userId (int): The user id
+        """
+
+        self.__userIds[record] = userId
+        self.__file.seek(TEMPLATESTORE_HEADERSIZE + 4 * record)
+        self.__file.write(ustruct.pack('<I', userId))
+
+    def getSystemID(self):
+        """
+        Gets the system id of the sensor the templates come from.
+
+        Returns:
+            The system id (int).
+        """
+
+        return self.__systemID
+
+    def getTemplateSize(self):
+        """
+        Gets the size of one template.
+
+        Returns:
+            The size in bytes (int).
+        """
+
+        return self.__templateSize
+
+    def getCapacity(self):
+        """
+        Gets the maximum number of templates.
+
+        Returns:
+            The capacity (int).
+        """
+
+        return self.__capacity
+
+    def getUserIds(self):
+        """
+        Gets the ids of all users with a stored template.
+
+        Returns:
+            A generator of user ids (int).
+        """
+
+        for userId in self.__userIds:
+            if ( userId != TEMPLATESTORE_UNUSED ):
+                yield userId
+
+    def put(self, userId, characteristicsData):
+        """
+        Stores the template of a user, replacing any previous one.
+
+        Arguments:
+            userId (int): The user id (0 to 0xFFFFFFFE)
+            characteristicsData: The template (bytes, bytearray or memoryview)
+
+        Raises:
+            ValueError: if the user id or template size is invalid, or the store is full
+        """
+
+        if ( userId < 0 or userId >= TEMPLATESTORE_UNUSED ):
+            raise ValueError('The given user id is invalid!')
+
+        if ( len(characteristicsData) != self.__templateSize ):
+            raise ValueError('The given template size is invalid!')
+
+        record = self.__find(userId)
+
+        if ( record < 0 ):
+            record = self.__findUnused()
+
+            if ( record < 0 ):
+                raise ValueError('The template store is full!')
+
+        ## Write the template before the index entry, so a partial write never indexes garbage
+        self.__file.seek(self.__recordsOffset + record * self.__templateSize)
+        self.__file.write(characteristicsData)
+
+        if ( self.__userIds[record] != userId ):
+            self.__writeUserId(record, userId)
+            self.__records[userId] = record
+            self.__count += 1
+
+        self.__file.flush()
+
+    def get(self, userId, buffer = None):
+        """
+        Reads the template of a user.
+
+        Arguments:
+            userId (int): The user id
+            buffer (bytearray): Optional buffer to read the template into.
+            Without it an internal buffer is reused.
+
+        Returns:
+            The template (memoryview), only valid until the next read if no
+            buffer is given, or None if the user has no template.
+        """
+
+        record = self.__find(userId)
+
+        if ( record < 0 ):
+            return None
+
+        if ( buffer is None ):
+            buffer = self.__buffer
+
+        view = memoryview(buffer)[:self.__templateSize]
+
+        self.__file.seek(self.__recordsOffset + record * self.__templateSize)
+        self.__file.readinto(view)
+
+        return view
+
+    def remove(self, userId):
+        """
+        Deletes the template of a user.
+
+        Arguments:
+            userId (int): The user id
+
+        Returns:
+            True if a template was deleted or False otherwise.
+        """
+
+        record = self.__find(userId)
+
+        if ( record < 0 ):
+            return False
+
+        self.__writeUserId(record, TEMPLATESTORE_UNUSED)
+        del self.__records[userId]
+        self.__count -= 1
+
+        if ( record < self.__freeHint ):
+            self.__freeHint = record
+        self.__file.flush()
+
+        return True
+
+    def download(self, sensor, userId, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+        """
+        Downloads the characteristics in a sensor char buffer and stores them for a user.
+
+        Arguments:
+            sensor (PyFingerprint): The sensor
+            userId (int): The user id
+            charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+
+        Raises:
+            ValueError: if the template size does not match the store, or the sensor is a `PyFingerprintAsync`
+            Exception: if any error occurs
+        """
+
+        _checkSync(sensor, 'downloadAsync')
+
+        length = sensor.downloadCharacteristics(charBufferNumber, self.__buffer)
+        self.put(userId, memoryview(self.__buffer)[:length])
+
+    async def downloadAsync(self, sensor, userId, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+        """
+        Downloads the characteristics in a char buffer of a `PyFingerprintAsync` sensor, see `download()`.
+        """
+
+        length = await sensor.downloadCharacteristics(charBufferNumber, self.__buffer)
+        self.put(userId, memoryview(self.__buffer)[:length])
+
+    def upload(self, sensor, userId, charBufferNumber = FINGERPRINT_CHARBUFFER1, verify = False):
+        """
+        Uploads the stored template of a user to a sensor char buffer.
+
+        Arguments:
+            sensor (PyFingerprint): The sensor
+            userId (int): The user id
+            charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+            verify (bool): Read the template back, see `PyFingerprint.uploadCharacteristics()`
+
+        Returns:
+            True if the template was uploaded or False if the user has no template.
+
+        Raises:
+            ValueError: if the sensor is a `PyFingerprintAsync`
+            Exception: if any error occurs
+        """
+
+        _checkSync(sensor, 'uploadAsync')
+
+        characteristicsData = self.get(userId)
+
+        if ( characteristicsData is None ):
+            return False
+
+        if ( not sensor.uploadCharacteristics(charBufferNumber, characteristicsData, verify) ):
+            raise Exception('The uploaded characteristics do not match!')
+
+        return True
+
+    async def uploadAsync(self, sensor, userId, charBufferNumber = FINGERPRINT_CHARBUFFER1, verify = False):
+        """
+        Uploads the stored template of a user to a char buffer of a `PyFingerprintAsync` sensor, see `upload()`.
+        """
+
+        characteristicsData = self.get(userId)
+
+        if ( characteristicsData is None ):
+            return False
+
+        if ( not await sensor.uploadCharacteristics(charBufferNumber, characteristicsData, verify) ):
+            raise Exception('The uploaded characteristics do not match!')
+
+        return True
+
+PAGER_LRU = 0
+"""Evict the least recently matched template."""
+
+PAGER_LFU = 1
+"""Evict the least frequently matched template."""
+
+class TemplatePager(object):
+    """
+    Uses a range of sensor positions as a cache for the templates of a `TemplateStore`.
+
+    Every match found by `search()` counts as a hit for the user at that
+    position. When a user who is not resident is paged in with `page()`, a
+    free position in the range is used or the coldest resident user is
+    evicted. The position to user mapping can be saved with `save()` and
+    restored with `load()`, since the templates stay on the sensor across
+    restarts.
+
+    """
+
+    def __init__(self, sensor, store, positionStart = 0, count = -1, policy = PAGER_LRU):
+        """
+        Constructor.
+
+        Arguments:
+            sensor (PyFingerprint): The sensor
+            store (TemplateStore): The host-side template store
+            positionStart (int): The first sensor position to manage
+            count (int): The number of positions to manage, -1 for all
+            remaining positions
+            policy (int): `PAGER_LRU` or `PAGER_LFU`
+
+        Raises:
+            ValueError: if the range or policy is invalid, or the sensor is a `PyFingerprintAsync`
+        """
+
+        _checkSync(sensor)
+
+        capacity = sensor.getStorageCapacity()
+
+        if ( count < 0 ):
+            count = capacity - positionStart
+
+        if ( positionStart < 0 or count <= 0 or positionStart + count > capacity ):
+            raise ValueError('The given position range is invalid!')
+
+        if ( policy != PAGER_LRU and policy != PAGER_LFU ):
+            raise ValueError('The given policy is invalid!')
+
+        self.__sensor = sensor
+        self.__store = store
+        self.__positionStart = positionStart
+        self.__count = count
+        self.__policy = policy
+
+        ## Per managed position: resident user, last access and number of hits
+        self.__userIds = array('I', (TEMPLATESTORE_UNUSED for _ in range(count)))
+        self.__lastUsed = array('I', (0 for _ in range(count)))
+        self.__hits = array('I', (0 for _ in range(count)))
+        self.__clock = 0
+
+    def __find(self, userId):
+        """
+        Finds the position index of a resident user.
+
+        Arguments:
+            userId (int): The user id
+
+        Returns:
+            The index (int) relative to the first managed position, or -1.
+        """
+
+        userIds = self.__userIds
+
+        for i in range(0, self.__count):
+            if ( userIds[i] == userId ):
+                return i
+
+        return -1
+
+    def __touch(self, i, hit):
+        """
+        Records an access to a managed position.
+
+        Arguments:
+            i (int): The index relative to the first managed position
+            hit (bool): True if the access was a match
+        """
+
+        self.__clock += 1
+        self.__lastUsed[i] = self.__clock
+
+        if ( hit ):
+            self.__hits[i] += 1
+
+    def __victim(self):
+        """
+        Selects the resident user to evict.
+
+        Returns:
+            The index (int) relative to the first managed position, or -1 if nothing is resident.
+        """
+
+        victim = -1
+
+        for i in range(0, self.__count):
+            if ( self.__userIds[i] == TEMPLATESTORE_UNUSED ):
+                continue
+
+            if ( victim < 0 ):
+                victim = i
+
+            elif ( self.__policy == PAGER_LFU and self.__hits[i] != self.__hits[victim] ):
+                if ( self.__hits[i] < self.__hits[victim] ):
+                    victim = i
+
+            elif ( self.__lastUsed[i] < self.__lastUsed[victim] ):
+                victim = i
+
+        return victim
+
+    def getPosition(self, userId):
+        """
+        Gets the sensor position of a resident user.
+
+        Arguments:
+            userId (int): The user id
+
+        Returns:
+            The position (int) or -1 if the user is not resident.
+        """
+
+        i = self.__find(userId)
+
+        if ( i < 0 ):
+            return -1
+
+        return self.__positionStart + i
+
+    def getUserId(self, positionNumber):
+        """
+        Gets the user resident at a sensor position.
+
+        Arguments:
+            positionNumber (int): The position
+
+        Returns:
+            The user id (int) or -1 if the position is not managed or not used by the pager.
+        """
+
+        i = positionNumber - self.__positionStart
+
+        if ( i < 0 or i >= self.__count or self.__userIds[i] == TEMPLATESTORE_UNUSED ):
+            return -1
+
+        return self.__userIds[i]
+
+    def search(self, charBufferNumber = FINGERPRINT_CHARBUFFER1):
+        """
+        Searches the managed positions for the characteristics in a char buffer and records the hit.
+
+        Arguments:
+            charBufferNumber (int): The char buffer. Use `FINGERPRINT_CHARBUFFER1` or `FINGERPRINT_CHARBUFFER2`.
+
+        Returns:
+            A tuple that contain the following information:
+            0: integer The user id of the match or -1.
+            1: integer The accuracy score of the match or -1.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        positionNumber, accuracyScore = self.__sensor.searchTemplate(charBufferNumber, self.__positionStart, self.__count)
+
+        userId = self.getUserId(positionNumber)
+
+        if ( userId < 0 ):
+            return (-1, -1)
+
+        self.__touch(positionNumber - self.__positionStart, True)
+
+        return (userId, accuracyScore)
+
+    def page(self, userId, charBufferNumber = FINGERPRINT_CHARBUFFER2):
+        """
+        Makes the template of a user resident on the sensor.
+
+        Arguments:
+            userId (int): The user id
+            charBufferNumber (int): The char buffer used for the upload. The
+            default keeps a scan in char buffer 1 intact.
+
+        Returns:
+            The sensor position (int) of the template, or -1 if the store has no template for the user.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        i = self.__find(userId)
+
+        if ( i >= 0 ):
+            self.__touch(i, False)
+            return self.__positionStart + i
+
+        if ( userId not in self.__store ):
+            return -1
+
+        positionNumber = self.__sensor.getFreePosition(self.__positionStart)
+
+        if ( positionNumber < 0 or positionNumber >= self.__positionStart + self.__count ):
+            i = self.__victim()
+
+            if ( i < 0 ):
+                raise Exception('No position is available for paging!')
+
+            positionNumber = self.__positionStart + i
+
+        i = positionNumber - self.__positionStart
+
+        ## Until the new template is stored the position keeps the evicted
+        ## one, so the mapping only changes once both steps succeeded
+        self.__store.upload(self.__sensor, userId, charBufferNumber)
+        self.__sensor.storeTemplate(positionNumber, charBufferNumber)
+
+        self.__userIds[i] = userId
+        self.__hits[i] = 0
+        self.__touch(i, False)
+
+        return positionNumber
+
+    def prefetch(self, userIds):
+        """
+        Pages in the templates of several users, e.g. the regulars before the morning rush.
+
+        Arguments:
+            userIds: An iterable of user ids, hottest first
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        for userId in userIds:
+            self.page(userId)
+
+    def evict(self, userId):
+        """
+        Deletes the template of a user from the sensor.
+
+        Arguments:
+            userId (int): The user id
+
+        Returns:
+            True if the user was resident or False otherwise.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        i = self.__find(userId)
+
+        if ( i < 0 ):
+            return False
+
+        self.__sensor.deleteTemplate(self.__positionStart + i)
+        self.__userIds[i] = TEMPLATESTORE_UNUSED
+
+        return True
+
+    def save(self, path):
+        """
+        Saves the position to user mapping and the hit statistics.
+
+        Arguments:
+            path (str): The file path
+        """
+
+        with open(path, 'wb') as f:
+            f.write(ustruct.pack('<HHI', self.__positionStart, self.__count, self.__clock))
+            f.write(self.__userIds)
+            f.write(self.__lastUsed)
+            f.write(self.__hits)
+
+    def load(self, path):
+        """
+        Restores the position to user mapping and the hit statistics saved with `save()`.
+
+        Arguments:
+            path (str): The file path
+
+        Raises:
+            ValueError: if the file was saved for another position range
+        """
+
+        with open(path, 'rb') as f:
+            positionStart, count, clock = ustruct.unpack('<HHI', f.read(8))
+
+            if ( positionStart != self.__positionStart or count != self.__count ):
+                raise ValueError('The given file belongs to another position range!')
+
+            f.readinto(self.__userIds)
+            f.readinto(self.__lastUsed)
+            f.readinto(self.__hits)
+
+        self.__clock = clock
+
+class TemplateMatcher(object):
+    """
+    Matches a scan against templates of a `TemplateStore` that are not on the sensor.
+
+    The scan stays in char buffer 1 while every candidate template is
+    uploaded to char buffer 2 and compared with `compareCharacteristics()`.
+    Each comparison costs one upload (without verification) and one round
+    trip, so `getThroughput()` tells how many off-sensor users can be
+    checked in the time available. The next candidate is read from the
+    store while the sensor compares the current one, see `PyFingerprint.defer()`.
+
+    """
+
+    def __init__(self, sensor, store):
+        """
+        Constructor.
+
+        Arguments:
+            sensor (PyFingerprint): The sensor
+            store (TemplateStore): The host-side template store
+
+        Raises:
+            ValueError: if the sensor is a `PyFingerprintAsync`
+        """
+
+        _checkSync(sensor)
+
+        self.__sensor = sensor
+        self.__store = store
+        self.__comparisons = 0
+        self.__elapsed = 0
+
+        ## Two buffers, one is uploaded while the next candidate is read into the other
+        self.__buffers = (bytearray(store.getTemplateSize()), bytearray(store.getTemplateSize()))
+        self.__spare = 0
+        self.__candidates = None
+        self.__prefetched = None
+
+    def __prefetch(self):
+        """Reads the template of the next candidate into the spare buffer."""
+
+        for userId in self.__candidates:
+            characteristicsData = self.__store.get(userId, self.__buffers[self.__spare])
+
+            if ( characteristicsData is not None ):
+                self.__prefetched = (userId, characteristicsData)
+                return
+
+        self.__prefetched = None
+
+    def match(self, candidates = None, priority = None, minimumScore = 1):
+        """
+        Compares the scan in char buffer 1 with candidate templates until one matches.
+
+        Arguments:
+            candidates: An iterable of user ids to check, all users of the store by default
+            priority: Optional function returning a priority for a user id;
+            candidates with a higher priority are checked first
+            minimumScore (int): The accuracy score a comparison must reach to count as a match
+
+        Returns:
+            A tuple that contain the following information:
+            0: integer The user id of the match or -1.
+            1: integer The accuracy score of the match or -1.
+
+        Raises:
+            Exception: if any error occurs
+        """
+
+        if ( candidates is None ):
+            candidates = self.__store.getUserIds()
+
+        if ( priority is not None ):
+            candidates = sorted(candidates, key = priority, reverse = True)
+
+        self.__comparisons = 0
+        start = ticks_ms()
+
+        self.__candidates = iter(candidates)
+        self.__spare = 0
+
+        try:
+            self.__prefetch()
+
+            while ( self.__prefetched is not None ):
+                userId, characteristicsData = self.__prefetched
+
+                self.__sensor.uploadCharacteristics(FINGERPRINT_CHARBUFFER2, characteristicsData, verify = False)
+
+                self.__spare ^= 1
+                self.__sensor.defer(self.__prefetch)
+
+                accuracyScore = self.__sensor.compareCharacteristics()
+                self.__comparisons += 1
+
+                if ( accuracyScore >= minimumScore ):
+                    return (userId, accuracyScore)
+
+            return (-1, -1)
+
+        finally:
+            self.__candidates = None
+            self.__prefetched = None
+            self.__elapsed = ticks_diff(ticks_ms(), start)
+
+    def getComparisons(self):
+        """
+        Gets the number of comparisons made by the last `match()`.
+
+        Returns:
+            The number of comparisons (int).
+        """
+
+        return self.__comparisons
+
+    def getThroughput(self):
+        """
+        Gets the comparison rate of the last `match()`.
+
+        Returns:
+            The comparisons per second (float), 0 if nothing was compared.
+        """
+
+        if ( self.__comparisons == 0 ):
+            return 0
+
+        return self.__comparisons * 1000 / max(self.__elapsed, 1)
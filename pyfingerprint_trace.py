@@ -0,0 +1,288 @@
+"""
+PyFingerprint protocol traces
+
+Records the frames exchanged with a sensor to a binary trace file, see
+`PyFingerprint.setRecorder()`, and replays a trace as a fake UART, so a
+session recorded on a device can be run again without the sensor.
+
+"""
+
+try:
+    import ustruct
+except ImportError:
+    import struct as ustruct
+
+from pyfingerprint import ticks_ms, ticks_us, ticks_diff
+
+
+## File layout
+##
+## Header:  magic (4 bytes), version (1 byte)
+## Records: direction (1 byte), microseconds since the previous record (4 bytes, at most 0xFFFFFFFF),
+##          frame length (2 bytes), frame (start code, address, type, length, payload, checksum)
+##          or the raw bytes received outside of a frame
+
+TRACE_MAGIC = b'PFTR'
+TRACE_VERSION = 2
+TRACE_HEADER = '<4sB'
+TRACE_HEADERSIZE = 5
+TRACE_RECORD = '<BIH'
+TRACE_RECORDSIZE = 7
+
+TRACE_SENT = 0
+"""Direction of a frame sent by the host."""
+
+TRACE_RECEIVED = 1
+"""Direction of a frame received from the sensor."""
+
+TRACE_RAW = 2
+"""Direction of bytes received from the sensor outside of a frame, e.g. the handshake byte after a soft reset."""
+
+class TraceRecorder(object):
+    """
+    Writes every frame sent to and received from a sensor to a trace file.
+
+    """
+
+    def __init__(self, path):
+        """
+        Constructor. Creates or replaces the trace file.
+
+        Arguments:
+            path (str): The path of the trace file
+        """
+
+        self.__file = open(path, 'wb')
+        self.__file.write(ustruct.pack(TRACE_HEADER, TRACE_MAGIC, TRACE_VERSION))
+        self.__record = bytearray(TRACE_RECORDSIZE)
+        self.__last = ticks_us()
+        self.__lastMs = ticks_ms()
+
+    def close(self):
+        """Closes the trace file."""
+
+        if ( self.__file is not None ):
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __write(self, direction, frame):
+        """
+        Appends a frame to the trace file.
+
+        Arguments:
+            direction (int): `TRACE_SENT`, `TRACE_RECEIVED` or `TRACE_RAW`
+            frame (memoryview): The frame or the raw bytes
+        """
+
+        now = ticks_us()
+        nowMs = ticks_ms()
+
+        ## ticks_us() wraps after about 9 minutes on MicroPython, so longer
+        ## idle gaps are measured with ticks_ms()
+        elapsed = ticks_diff(nowMs, self.__lastMs)
+
+        if ( elapsed < 60000 ):
+            elapsed = ticks_diff(now, self.__last)
+        else:
+            elapsed = elapsed * 1000
+
+        self.__last = now
+        self.__lastMs = nowMs
+
+        ustruct.pack_into(TRACE_RECORD, self.__record, 0, direction, min(max(0, elapsed), 0xFFFFFFFF), len(frame))
+        self.__file.write(self.__record)
+        self.__file.write(frame)
+
+    def frameSent(self, frame):
+        """
+        Called by the sensor when a frame is sent.
+
+        Arguments:
+            frame (memoryview): The frame
+        """
+
+        self.__write(TRACE_SENT, frame)
+
+    def frameReceived(self, frame):
+        """
+        Called by the sensor when a frame is received.
+
+        Arguments:
+            frame (memoryview): The frame
+        """
+
+        self.__write(TRACE_RECEIVED, frame)
+
+    def bytesReceived(self, data):
+        """
+        Called by the sensor when bytes are received outside of a frame.
+
+        Arguments:
+            data (memoryview): The bytes
+        """
+
+        self.__write(TRACE_RAW, data)
+
+def readTrace(path):
+    """
+    Reads a trace file.
+
+    Arguments:
+        path (str): The path of the trace file
+
+    Returns:
+        A generator of tuples that contain the following information:
+        0: integer The direction, `TRACE_SENT`, `TRACE_RECEIVED` or `TRACE_RAW`.
+        1: integer The microseconds since the previous frame.
+        2: integer(1 byte) The packet type, None for raw bytes.
+        3: bytes The frame or the raw bytes.
+
+    Raises:
+        ValueError: if the file is no trace file
+    """
+
+    with open(path, 'rb') as f:
+        magic, version = ustruct.unpack(TRACE_HEADER, f.read(TRACE_HEADERSIZE))
+
+        if ( magic != TRACE_MAGIC or version < 1 or version > TRACE_VERSION ):
+            raise ValueError('The given file is no trace file!')
+
+        while ( True ):
+            record = f.read(TRACE_RECORDSIZE)
+
+            if ( len(record) < TRACE_RECORDSIZE ):
+                return
+
+            direction, elapsed, length = ustruct.unpack(TRACE_RECORD, record)
+            frame = f.read(length)
+
+            yield (direction, elapsed, None if direction == TRACE_RAW else frame[6], frame)
+
+class TraceReplayer(object):
+    """
+    Fake `machine.UART` that answers like the sensor in a trace.
+
+    Every frame written must match the next frame the host sent in the
+    trace. The frames and raw bytes the sensor answered with are then
+    returned by `read()` and `readinto()`. With timing, each answer only becomes
+    readable after the delay recorded in the trace.
+
+    """
+
+    def __init__(self, path, timing = False):
+        """
+        Constructor.
+
+        Arguments:
+            path (str): The path of the trace file
+            timing (bool): Delay the answers like in the trace
+
+        Raises:
+            ValueError: if the file is no trace file
+        """
+
+        self.__frames = list(readTrace(path))
+        self.__next = 0
+        self.__timing = timing
+        self.__input = bytearray()
+        self.__output = bytearray()
+
+        ## Answers not yet readable: (microseconds after the write, frame)
+        self.__pending = []
+        self.__writtenAt = 0
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def isComplete(self):
+        """
+        Checks if all frames of the trace were replayed.
+
+        Returns:
+            True if the trace is complete or False otherwise.
+        """
+
+        return self.__next == len(self.__frames) and not self.__pending and not self.__output
+
+    def __release(self):
+        """Makes the answers readable whose delay has passed."""
+
+        pending = self.__pending
+
+        while ( pending ):
+            if ( self.__timing and ticks_diff(ticks_us(), self.__writtenAt) < pending[0][0] ):
+                return
+
+            self.__output += pending.pop(0)[1]
+
+    def any(self):
+        self.__release()
+        return len(self.__output)
+
+    def read(self, count = -1):
+        self.__release()
+
+        if ( not self.__output ):
+            return None
+
+        if ( count < 0 ):
+            count = len(self.__output)
+
+        data = bytes(self.__output[:count])
+        del self.__output[:count]
+        return data
+
+    def readinto(self, buffer, count = None):
+        self.__release()
+
+        if ( not self.__output ):
+            return None
+
+        count = min(len(buffer) if count is None else count, len(self.__output))
+        buffer[:count] = self.__output[:count]
+        del self.__output[:count]
+        return count
+
+    def write(self, data):
+        self.__input += data
+        frames = self.__frames
+
+        while ( self.__next < len(frames) and frames[self.__next][0] == TRACE_SENT ):
+            frame = frames[self.__next][3]
+
+            length = min(len(self.__input), len(frame))
+
+            if ( self.__input[:length] != frame[:length] ):
+                raise Exception('The written frame differs from frame ' + str(self.__next) + ' of the trace')
+
+            if ( length < len(frame) ):
+                break
+
+            del self.__input[:len(frame)]
+            self.__next += 1
+
+            ## Queue the answers to this frame, earlier answers are due by now
+            while ( self.__pending ):
+                self.__output += self.__pending.pop(0)[1]
+
+            self.__writtenAt = ticks_us()
+            delay = 0
+
+            while ( self.__next < len(frames) and frames[self.__next][0] != TRACE_SENT ):
+                delay += frames[self.__next][1]
+                self.__pending.append((delay, frames[self.__next][3]))
+                self.__next += 1
+
+        if ( self.__next == len(frames) and self.__input ):
+            raise Exception('The trace has no more frames')
+
+        return len(data)
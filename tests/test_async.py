@@ -0,0 +1,106 @@
+"""
+Tests of `PyFingerprintAsync` against the sensor emulator.
+
+On CPython the UART streams of uasyncio are provided by a small shim that
+polls the emulator.
+
+"""
+
+import asyncio
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import uasyncio
+except ImportError:
+    class _StreamReader(object):
+        def __init__(self, stream):
+            self.__stream = stream
+
+        async def readexactly(self, n):
+            data = b''
+
+            while ( len(data) < n ):
+                chunk = self.__stream.read(n - len(data))
+
+                if ( chunk ):
+                    data += chunk
+                else:
+                    await asyncio.sleep(0.001)
+
+            return data
+
+    class _StreamWriter(object):
+        def __init__(self, stream, extra):
+            self.__stream = stream
+            self.__buffer = b''
+
+        def write(self, data):
+            self.__buffer += bytes(data)
+
+        async def drain(self):
+            self.__stream.write(self.__buffer)
+            self.__buffer = b''
+
+    uasyncio = types.ModuleType('uasyncio')
+    uasyncio.__dict__.update(asyncio.__dict__)
+    uasyncio.StreamReader = _StreamReader
+    uasyncio.StreamWriter = _StreamWriter
+    sys.modules['uasyncio'] = uasyncio
+
+from pyfingerprint import PyFingerprintAsync
+from pyfingerprint_emulator import SensorEmulator
+from pyfingerprint_manager import SensorManager
+
+
+class PostedCommandTest(unittest.TestCase):
+
+    def __identifyWithLed(self, wait):
+        sensor = SensorEmulator(speed = 0)
+        sensor.setTemplate(5, sensor.getCharacteristics(9))
+        f = PyFingerprintAsync(sensor)
+
+        async def placeFinger():
+            await asyncio.sleep(0.1)
+            sensor.placeFinger(9)
+
+        async def ledOn():
+            await asyncio.sleep(0.05)
+            await f.ledOn(wait = wait)
+
+        async def main():
+            return (await asyncio.gather(f.identify(timeout = 2000), placeFinger(), ledOn()))[0]
+
+        self.assertEqual(asyncio.run(main()), (5, 100))
+        self.assertTrue(sensor.getLed())
+        self.assertIsNone(f.getPostedError())
+
+    def test_led_while_polling(self):
+        self.__identifyWithLed(True)
+
+    def test_posted_led_while_polling(self):
+        self.__identifyWithLed(False)
+
+    def test_posted_led_on_shared_uart(self):
+        sensor = SensorEmulator(speed = 0)
+        sensor.setTemplate(2, sensor.getCharacteristics(1))
+
+        manager = SensorManager()
+        a = manager.addSensor('a', sensor)
+        b = manager.addSensor('b', sensor)
+
+        async def main():
+            await a.ledOn(wait = False)
+            return await b.getTemplateCount()
+
+        self.assertEqual(asyncio.run(main()), 1)
+        self.assertTrue(sensor.getLed())
+        self.assertIsNone(a.getPostedError())
+
+
+if __name__ == '__main__':
+    unittest.main()